@@ -0,0 +1,124 @@
+#!/usr/bin/env python
+#  -*- mode: python; -*-
+#
+# Volatility
+#
+# This file is part of Volatility.
+#
+# Volatility is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# Volatility is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Volatility.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""
+Microbenchmark for struct member access on the shipped Windows vtypes.
+
+For every struct in the profile with native or bitfield members, this
+times reading all of those members with struct.m(name).v(), making the
+member objects through the generic members table (the Curry and Object
+factory chain) against making them from the struct's decoder table
+(see Profile._compile_decoders), both on the live address space and on
+a snapshot of the struct. The data is random, since only the cost of
+the decoding is being measured.
+
+Usage: member_bench.py [-p PROFILE] [-r ROUNDS]
+"""
+
+import os, sys, random, time
+from optparse import OptionParser
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import volatility.conf as conf
+import volatility.registry as registry
+import volatility.commands as commands
+import volatility.addrspace as addrspace
+import volatility.obj as obj
+
+def setup(profile):
+    config = conf.ConfObject()
+    registry.PluginImporter()
+    registry.register_global_options(config, addrspace.BaseAddressSpace)
+    registry.register_global_options(config, commands.Command)
+    config.parse_options(False)
+    config.PROFILE = profile
+    return config
+
+def get_structs(space):
+    """Returns a list of (struct, member names) to read"""
+    random.seed(0)
+    result = []
+    # Types are compiled on first use, so compile them all up front
+    space.profile.types.compile_all()
+    for name in sorted(space.profile.vtypes.keys()):
+        if name == 'VOLATILITY_MAGIC':
+            continue
+        offset = random.randrange(0, 0x1000) & ~7
+        s = obj.Object(name, offset, space)
+        if (isinstance(s, obj.CType) and s._vol_decoders and s.size() and
+                offset + s.size() <= len(space.data)):
+            result.append((s, sorted(s._vol_decoders.keys())))
+    return result
+
+def without_decoders(structs):
+    """Returns copies of the structs which make all their members through the members table"""
+    result = []
+    for s, members in structs:
+        copy = s.obj_vm.profile.types[s.obj_type](offset = s.obj_offset, vm = s.obj_vm, name = s.obj_name)
+        object.__setattr__(copy, '_vol_decoders', {})
+        result.append((copy, members))
+    return result
+
+def time_reads(structs, rounds, read):
+    count = 0
+    start = time.time()
+    for _ in range(rounds):
+        for s, members in structs:
+            for m in members:
+                read(s, m)
+                count += 1
+    return count, time.time() - start
+
+def main():
+    parser = OptionParser(usage = "%prog [-p PROFILE] [-r ROUNDS]")
+    parser.add_option("-p", "--profile", default = "WinXPSP2x86", help = "Profile to benchmark")
+    parser.add_option("-r", "--rounds", default = 5, type = "int", help = "Number of passes over the structs")
+    opts, _ = parser.parse_args()
+
+    config = setup(opts.profile)
+    random.seed(0)
+    data = "".join(chr(random.randrange(256)) for _ in range(0x10000))
+    space = addrspace.BufferAddressSpace(config, data = data)
+
+    structs = get_structs(space)
+    snapshots = [ (s.snapshot(), members) for s, members in structs ]
+    print "{0}: {1} structs, {2} members".format(opts.profile, len(structs),
+                                                sum([ len(m) for _, m in structs ]))
+
+    read = lambda s, m: s.m(m).v()
+    tests = [("members table", without_decoders(structs), read),
+             ("decoders", structs, read),
+             ("members table (snapshot)", without_decoders(snapshots), read),
+             ("decoders (snapshot)", snapshots, read)]
+
+    baseline = None
+    for name, targets, read in tests:
+        # Both ways must give the same values
+        assert [ [ str(read(s, m)) for m in members ] for s, members in targets ] == \
+               [ [ str(read(s, m)) for m in members ] for s, members in tests[0][1] ], name
+        count, elapsed = time_reads(targets, opts.rounds, read)
+        rate = count / elapsed
+        baseline = baseline or rate
+        print "{0:<28} {1:>10.0f} reads/s  {2:>5.1f}x".format(name, rate, rate / baseline)
+
+if __name__ == "__main__":
+    main()
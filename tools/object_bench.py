@@ -0,0 +1,160 @@
+#!/usr/bin/env python
+#  -*- mode: python; -*-
+#
+# Volatility
+#
+# This file is part of Volatility.
+#
+# Volatility is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# Volatility is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Volatility.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""
+Benchmark for the cost of making objects (and NoneObjects).
+
+Without an image, this instantiates every member of every struct in
+the profile over random data, so the mix of NativeTypes, BitFields,
+Pointers, Arrays and CTypes is the one the profile itself has, and
+dereferences the pointers (which, the data being random, mostly gives
+NoneObjects). It reports how many objects are made per second, and
+how much memory each object takes when a large number of them are
+kept alive.
+
+With an image (-f), it instead runs a plugin (handles, by default)
+against it and reports the time taken and the peak RSS of the process.
+
+Usage: object_bench.py [-p PROFILE] [-r ROUNDS] [-n OBJECTS]
+       object_bench.py -f IMAGE [-p PROFILE] [-d DTB] [-P PLUGIN]
+"""
+
+import os, sys, random, time, resource
+from optparse import OptionParser
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import volatility.conf as conf
+import volatility.registry as registry
+import volatility.commands as commands
+import volatility.addrspace as addrspace
+import volatility.obj as obj
+
+def setup(profile):
+    config = conf.ConfObject()
+    registry.PluginImporter()
+    registry.register_global_options(config, addrspace.BaseAddressSpace)
+    registry.register_global_options(config, commands.Command)
+    config.parse_options(False)
+    config.PROFILE = profile
+    return config
+
+def peak_rss():
+    """Returns the peak RSS of this process in KB"""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+def get_members(space):
+    """Returns a list of (struct type, offset, member names) to make"""
+    random.seed(0)
+    result = []
+    # Types are compiled on first use, so compile them all up front
+    space.profile.types.compile_all()
+    for name in sorted(space.profile.vtypes.keys()):
+        if name == 'VOLATILITY_MAGIC':
+            continue
+        offset = random.randrange(0, 0x1000) & ~7
+        s = obj.Object(name, offset, space)
+        if not (isinstance(s, obj.CType) and s.members and s.size() and offset + s.size() <= len(space.data)):
+            continue
+        names = []
+        for m in sorted(s.members.keys()):
+            # A few of the vtypes describe members which can't be made
+            try:
+                s.m(m)
+            except Exception:
+                continue
+            names.append(m)
+        result.append((name, offset, names))
+    return result
+
+def make_objects(space, members):
+    """Makes the structs and their members (dereferencing the pointers),
+       yielding everything that gets made"""
+    for name, offset, names in members:
+        s = obj.Object(name, offset, space)
+        yield s
+        for m in names:
+            member = s.m(m)
+            yield member
+            if isinstance(member, obj.Pointer):
+                yield member.dereference()
+
+def bench_synthetic(config, opts):
+    random.seed(0)
+    data = "".join(chr(random.randrange(256)) for _ in range(0x10000))
+    space = addrspace.BufferAddressSpace(config, data = data)
+    members = get_members(space)
+    print "{0}: {1} structs, {2} members".format(opts.profile, len(members),
+                                                sum([ len(n) for _, _, n in members ]))
+
+    # Memory first, since the peak RSS never comes down again
+    before = peak_rss()
+    kept = []
+    while len(kept) < opts.objects:
+        kept.extend(make_objects(space, members))
+    grown = peak_rss() - before
+    print "{0:<20} {1:>10} objects  {2:>8} KB  {3:>6.0f} bytes/object".format(
+        "memory", len(kept), grown, grown * 1024.0 / len(kept))
+    nones = len([ o for o in kept if isinstance(o, obj.NoneObject) ])
+    del kept
+
+    count = 0
+    start = time.time()
+    for _ in range(opts.rounds):
+        for _ in make_objects(space, members):
+            count += 1
+    elapsed = time.time() - start
+    print "{0:<20} {1:>10.0f} objects/s ({2:.0f}% NoneObjects)".format(
+        "throughput", count / elapsed, nones * 100.0 / opts.objects)
+
+def bench_plugin(config, opts):
+    config.LOCATION = "file://" + os.path.abspath(opts.filename)
+    if opts.dtb:
+        config.DTB = int(opts.dtb, 0)
+    cls = registry.get_plugin_class(commands.Command, opts.plugin, lower = True)
+    if not cls:
+        sys.exit("No such plugin {0}".format(opts.plugin))
+
+    start = time.time()
+    rows = 0
+    for _ in cls(config).calculate():
+        rows += 1
+    elapsed = time.time() - start
+    print "{0}: {1} results in {2:.2f}s, peak RSS {3} KB".format(opts.plugin, rows, elapsed, peak_rss())
+
+def main():
+    parser = OptionParser(usage = "%prog [-f IMAGE] [-p PROFILE] [-d DTB] [-P PLUGIN] [-r ROUNDS] [-n OBJECTS]")
+    parser.add_option("-f", "--filename", default = None, help = "Image to run the plugin against")
+    parser.add_option("-p", "--profile", default = "WinXPSP2x86", help = "Profile to benchmark")
+    parser.add_option("-d", "--dtb", default = None, help = "DTB of the image (if it can't be found)")
+    parser.add_option("-P", "--plugin", default = "handles", help = "Plugin to run against the image")
+    parser.add_option("-r", "--rounds", default = 5, type = "int", help = "Number of passes over the structs")
+    parser.add_option("-n", "--objects", default = 500000, type = "int", help = "Number of objects to keep alive")
+    opts, _ = parser.parse_args()
+
+    config = setup(opts.profile)
+    if opts.filename:
+        bench_plugin(config, opts)
+    else:
+        bench_synthetic(config, opts)
+
+if __name__ == "__main__":
+    main()
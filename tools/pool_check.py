@@ -0,0 +1,114 @@
+#!/usr/bin/env python
+#  -*- mode: python; -*-
+#
+# Volatility
+#
+# This file is part of Volatility.
+#
+# Volatility is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# Volatility is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Volatility.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""
+Checks that the batched pool header checks agree with the per-offset ones.
+
+For each Windows profile (or those given), this lays out a pool header
+for every value the PoolType, BlockSize and PoolIndex fields can hold,
+and runs CheckPoolType, CheckPoolSize and CheckPoolIndex over them both
+with check_block() and with check(). Any offset on which the two
+disagree is reported, and the exit status is 1.
+
+Usage: pool_check.py [PROFILE ...]
+"""
+
+import os, sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import volatility.conf as conf
+import volatility.registry as registry
+import volatility.commands as commands
+import volatility.addrspace as addrspace
+import volatility.obj as obj
+import volatility.plugins.common as common
+
+## The distance between the pool tags laid out
+STRIDE = 0x40
+
+def setup():
+    config = conf.ConfObject()
+    registry.PluginImporter()
+    registry.register_global_options(config, addrspace.BaseAddressSpace)
+    registry.register_global_options(config, commands.Command)
+    config.parse_options(False)
+    return config
+
+def make_space(config, profile, name):
+    """Returns a buffer address space with a pool header for every value of the named field"""
+    config.update('PROFILE', profile)
+    space = addrspace.BufferAddressSpace(config)
+    fields = common.pool_header_fields(space.profile)
+    relative, fmt, mask, shift = fields.fields[name]
+
+    count = (mask >> shift) + 1
+    data = bytearray(STRIDE * (count + 1))
+    offsets = []
+    for value in range(count):
+        tag = STRIDE * (value + 1)
+        position = tag + relative
+        (current,) = fmt.unpack_from(str(data), position)
+        fmt.pack_into(data, position, current | (value << shift))
+        offsets.append(tag)
+
+    space.assign_buffer(str(data))
+    return space, offsets
+
+def compare(label, check, space, offsets):
+    expected = [ offset for offset in offsets if check.check(offset) ]
+    batched = check.check_block(space.data, 0, offsets)
+    if expected == batched:
+        return True
+    print "{0}: check() passed {1} headers, check_block() {2}".format(label, len(expected), len(batched))
+    for offset in sorted(set(expected).symmetric_difference(batched))[:10]:
+        print "    differ at 0x{0:x}".format(offset)
+    return False
+
+def main():
+    config = setup()
+    profiles = sys.argv[1:]
+    if not profiles:
+        profiles = sorted([ name for name, cls in registry.get_plugin_classes(obj.Profile).items()
+                            if cls._md_os == 'windows' ])
+
+    ok = True
+    for profile in profiles:
+        space, offsets = make_space(config, profile, 'PoolType')
+        for kwargs in [{'non_paged': True}, {'paged': True}, {'free': True},
+                       {'paged': True, 'non_paged': True, 'free': True}]:
+            label = "{0} CheckPoolType({1})".format(profile, ", ".join(sorted(kwargs)))
+            ok = compare(label, common.CheckPoolType(space, **kwargs), space, offsets) and ok
+
+        space, offsets = make_space(config, profile, 'BlockSize')
+        condition = lambda x: x >= 0x40
+        label = "{0} CheckPoolSize".format(profile)
+        ok = compare(label, common.CheckPoolSize(space, condition = condition), space, offsets) and ok
+
+        space, offsets = make_space(config, profile, 'PoolIndex')
+        label = "{0} CheckPoolIndex".format(profile)
+        ok = compare(label, common.CheckPoolIndex(space, value = 1), space, offsets) and ok
+
+    print "{0} profiles checked, {1}".format(len(profiles), "OK" if ok else "FAILED")
+    return 0 if ok else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -52,6 +52,7 @@ import volatility.registry as registry
 import volatility.exceptions as exceptions
 import volatility.obj as obj
 import volatility.debug as debug
+import volatility.cache as cache
 
 import volatility.addrspace as addrspace
 import volatility.commands as commands
@@ -61,6 +62,11 @@ config.add_option("INFO", default = None, action = "store_true",
                   cache_invalidator = False,
                   help = "Print information about all registered objects")
 
+config.add_option("NO-PLUGIN-INDEX", default = False, action = "store_true",
+                  cache_invalidator = False,
+                  help = "Import all plugins at startup, instead of only those needed " \
+                         "(and don't store the plugin index in the cache directory)")
+
 def list_plugins():
     result = "\n\tSupported Plugin Commands:\n\n"
     cmds = registry.get_plugin_classes(commands.Command, lower = True)
@@ -132,8 +138,13 @@ def main():
 
     # Setup the debugging format
     debug.setup()
-    # Load up modules in case they set config options
-    registry.PluginImporter()
+    # Store built profiles in the cache directory, so later runs can load
+    # them instead of building them again (unless --no-profile-cache)
+    obj.Profile.state_cache = cache.ProfileCache()
+    # Load up modules in case they set config options. The plugin commands
+    # (and anything else not needed to start up) are only imported when
+    # used, except when listing everything.
+    registry.PluginImporter(lazy = not (config.INFO or config.NO_PLUGIN_INDEX))
 
     ## Register all register_options for the various classes
     registry.register_global_options(config, addrspace.BaseAddressSpace)
@@ -150,10 +161,9 @@ def main():
 
     module = None
     ## Try to find the first thing that looks like a module name
-    cmds = registry.get_plugin_classes(commands.Command, lower = True)
     for m in config.args:
-        if m in cmds.keys():
-            module = m
+        module = registry.get_plugin_class(commands.Command, m, lower = True)
+        if module:
             break
 
     if not module:
@@ -161,8 +171,8 @@ def main():
         debug.error("You must specify something to do (try -h)")
 
     try:
-        if module in cmds.keys():
-            command = cmds[module](config)
+        if module:
+            command = module(config)
 
             ## Register the help cb from the command itself
             config.set_help_hook(obj.Curry(command_help, command))
@@ -33,6 +33,7 @@
 
 #pylint: disable-msg=C0111
 
+import bisect
 import fractions
 import volatility.obj as obj
 import volatility.registry as registry
@@ -181,6 +182,24 @@ class AbstractDiscreteAllocMemory(BaseAddressSpace):
     def translate(self, vaddr):
         raise NotImplementedError("This is an abstract method and should not be referenced directly")
 
+    def translate_contiguous(self, vaddr, length):
+        """Translates vaddr, returning (paddr, size) where size is how many
+           of the length bytes from vaddr map to consecutive addresses of the
+           base starting at paddr (or are all unmapped, if paddr is None).
+
+           This translates each alloc in turn, so that consecutive allocs
+           which are also consecutive in the base can be read in one go.
+        """
+        paddr = self.translate(vaddr)
+        size = min(length, self.alignment_gcd - (vaddr % self.alignment_gcd))
+        if paddr is None:
+            return None, size
+        while size < length:
+            if self.translate(vaddr + size) != paddr + size:
+                break
+            size = min(length, size + self.alignment_gcd)
+        return paddr, size
+
     def get_available_allocs(self):
         """A generator that returns (addr, size) for each of the virtual addresses present, sorted by offset"""
         raise NotImplementedError("This is an abstract method and should not be referenced directly")
@@ -218,13 +237,9 @@ class AbstractDiscreteAllocMemory(BaseAddressSpace):
         buff = ""
         read = self.base.zread if pad else self.base.read
 
-        # For each allocation...
+        # For each contiguous piece of the base...
         while remaining > 0:
-            # Determine whether we're within an alloc or not
-            alloc_remaining = (self.alignment_gcd - (addr % self.alignment_gcd))
-            # Try to jump out early
-            paddr = self.translate(position)
-            datalen = min(remaining, alloc_remaining)
+            paddr, datalen = self.translate_contiguous(position, remaining)
             if paddr is None:
                 if not pad:
                     return None
@@ -240,7 +255,7 @@ class AbstractDiscreteAllocMemory(BaseAddressSpace):
                 else:
                     data = None
 
-                if data is None:
+                if data is None or len(data) != datalen:
                     if not pad:
                         return obj.NoneObject("Could not read_chunks from addr " + hex(position) + " of size " + hex(datalen))
                     data = "\x00" * datalen
@@ -276,6 +291,12 @@ class AbstractRunBasedMemory(AbstractDiscreteAllocMemory):
         AbstractDiscreteAllocMemory.__init__(self, base, config, *args, **kwargs)
         self.runs = []
         self.header = None
+        ## Sorted copies of the run starts, ends and output addresses
+        ## for bisecting, rebuilt whenever self.runs changes
+        self._indexed_runs = None
+        self._run_starts = []
+        self._run_ends = []
+        self._run_outputs = []
 
     def get_runs(self):
         """Get the memory block info"""
@@ -285,21 +306,38 @@ class AbstractRunBasedMemory(AbstractDiscreteAllocMemory):
         """Get the header info"""
         return self.header
 
+    def _find_run(self, addr):
+        """Returns the index (into the sorted run lists) of the run before
+           or containing addr, or -1 if addr is before all the runs."""
+        if self._indexed_runs is not self.runs or len(self._run_starts) != len(self.runs):
+            runs = sorted([ (int(i), int(o), int(l)) for i, o, l in self.runs ])
+            self._run_starts = [ i for i, _, _ in runs ]
+            self._run_ends = [ i + l for i, _, l in runs ]
+            self._run_outputs = [ o for _, o, _ in runs ]
+            self._indexed_runs = self.runs
+        return bisect.bisect_right(self._run_starts, addr) - 1
+
     def translate(self, addr):
         """Find the offset in the file where a memory address can be found.
 
         @param addr: a memory address
         """
-        for input_addr, output_addr, length in self.runs:
-            if addr >= input_addr and addr < input_addr + length:
-                return output_addr + (addr - input_addr)
-            # Since runs are in order, we can bail out early if we're
-            # looking for something before the start of the current one
-            if addr < input_addr:
-                return None
+        i = self._find_run(addr)
+        if i >= 0 and addr < self._run_ends[i]:
+            return self._run_outputs[i] + (addr - self._run_starts[i])
 
         return None
 
+    def translate_contiguous(self, addr, length):
+        """Translates addr, returning (paddr, size) for up to length bytes
+           of the run containing addr (or of the gap before the next run)"""
+        i = self._find_run(addr)
+        if i >= 0 and addr < self._run_ends[i]:
+            return self._run_outputs[i] + (addr - self._run_starts[i]), min(length, self._run_ends[i] - addr)
+        if i + 1 < len(self._run_starts):
+            return None, min(length, self._run_starts[i + 1] - addr)
+        return None, length
+
     def get_available_allocs(self):
         """Get a list of accessible physical memory regions"""
         for input_addr, _, length in self.runs:
@@ -28,16 +28,18 @@ The volatility caching subsystem has the following design goals:
 
  2) Cached objects are stored by a hierarchical key namespace. Keys
     are specified in a URL notation. By default, relative URLs are
-    interpreted relative to the memory image location (the value of
-    the --location option). This scheme allows us to specify both
-    global (per installation) and per image keys. For example given an
-    image located in /tmp/foobar.img:
+    interpreted relative to the memory image (a hash of the
+    fingerprint of its contents, see image_key, rather than the value
+    of the --location option, so copies of an image share their
+    keys). This scheme allows us to specify both global (per
+    installation) and per image keys. For example given an image
+    whose key is 0123abcd:
 
-    - file:///tmp/foobar.img/kernel/debugging/KPCR refers to this
-      image's KPCR location.
+    - 0123abcd/kernel/debugging/KPCR refers to this image's KPCR
+      location.
 
-    - file:///tmp/foobar.img/address_spaces/memory_translation/pdpte
-      refers to the cached page tables.
+    - 0123abcd/address_spaces/memory_translation/pdpte refers to the
+      cached page tables.
 
     - http://www.volatility.org/schema#configuration/renderer specifies
       the currently configured renderer (i.e. its a global setting).
@@ -97,8 +99,8 @@ class PSScan(commands.Command):
 
 This will automatically create the CacheNode at the specified tree
 location (note that since the URL is given as a relative URL it is
-based at the current value of the --location - that means it applies
-to the current memory image only).
+based at the current memory image - that means it applies to the
+current memory image only).
 
 Note that since calculate() returns a generator, the decorator will
 also return a generator - It will not iterate over the calculate
@@ -108,6 +110,19 @@ this also means that if the generator is stopped prematurely, we are
 unable to cache the result set in the general case. This is the only
 caveat on caching generators.
 
+Invalidation
+------------
+A cached result is only valid for the image it was made from, so
+each node is stored with a fingerprint of the image's contents (see
+image_fingerprint) along with the profile and the options used to
+find the kernel. If an image is acquired again to the same location,
+the fingerprint differs and the cache misses. Other options only
+invalidate the results which were declared to depend on them:
+
+   @cache("tests/dlldump", depends = ["pid"])
+
+so that the rest of the cache can still be shared.
+
 Storage classes
 ---------------
 The cache system discussed above can be thought of as an abstract
@@ -129,6 +144,17 @@ that the cache directory for each image file is maintained in a Zip
 file stored at the --cache_direcory directive with the same filename
 as the image and a .zip extension.
 
+SQLite Storage
+==============
+Selected with --cache-engine=sqlite, this keeps the results of the
+cached functions for each image in a single SQLite database in the
+cache directory (see ResultStore), named by a hash of the image's
+fingerprint (see image_fingerprint). Results are stored a row at a time
+as tuples of primitives, with objects stored as references to their
+type and offset, so they are read back lazily and a generator which
+was stopped early is carried on from where it stopped the next time.
+The numbers of hits and misses are reported (at -v) on exit.
+
 
 Use cases
 ---------
@@ -211,20 +237,38 @@ The following common use cases are discussed:
 """
 import types
 import os
+import sys
+import glob
+import atexit
+import hashlib
+import marshal
+import functools
+import urllib
+import tempfile
 import urlparse
+import volatility.constants as constants
 import volatility.conf as conf
 import volatility.obj as obj
+import volatility.registry as registry
 import volatility.debug as debug
 import volatility.exceptions as exceptions
 import cPickle as pickle
 config = conf.ConfObject()
 
+try:
+    import sqlite3
+    has_sqlite = True
+except ImportError:
+    has_sqlite = False
+
 ## Where to stick the cache
 default_cache_location = os.path.join((os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache")), "volatility")
 
 config.add_option("CACHE-DIRECTORY", default = default_cache_location,
                   cache_invalidator = False,
-                  help = "Directory where cache files are stored")
+                  help = "Directory where cache files are stored. Built profiles " \
+                         "and the plugin index are stored here even without --cache " \
+                         "(see --no-profile-cache and --no-plugin-index)")
 
 class CacheContainsGenerator(exceptions.VolatilityException):
     """Exception raised when the cache contains a generator"""
@@ -234,6 +278,10 @@ class InvalidCache(Exception):
     """Exception raised when the cache item is determined to be invalid."""
     pass
 
+class UncacheableResult(exceptions.VolatilityException):
+    """Exception raised when a result can't be stored by the ResultStore"""
+    pass
+
 class CacheNode(object):
     """ Base class for Cache nodes """
     def __init__(self, name, stem, storage = None, payload = None, invalidator = None):
@@ -329,6 +377,98 @@ class BlockingNode(CacheNode):
         """Do not set a payload for a blocked cache node"""
         pass
 
+## How much of the start of an image, and how many blocks of the rest
+## of it, go into its fingerprint
+FINGERPRINT_HEADER_SIZE = 0x10000
+FINGERPRINT_BLOCK_SIZE = 0x1000
+FINGERPRINT_SAMPLES = 64
+
+## The fingerprints of the images seen, by "filename:size:mtime"
+_fingerprints = {}
+
+def _fingerprint_file():
+    return os.path.join(config.CACHE_DIRECTORY, "fingerprints")
+
+def _load_fingerprints():
+    try:
+        fd = open(_fingerprint_file(), "rb")
+        try:
+            _fingerprints.update(marshal.load(fd))
+        finally:
+            fd.close()
+    except (IOError, EOFError, ValueError, TypeError):
+        pass
+
+def _save_fingerprints():
+    """Stores the fingerprints so images are only read once"""
+    filename = _fingerprint_file()
+    try:
+        if not os.path.isdir(config.CACHE_DIRECTORY):
+            os.makedirs(config.CACHE_DIRECTORY)
+        fd, temp = tempfile.mkstemp(dir = config.CACHE_DIRECTORY)
+        os.write(fd, marshal.dumps(_fingerprints))
+        os.close(fd)
+        os.rename(temp, filename)
+    except (IOError, OSError), e:
+        debug.debug("Unable to store image fingerprints in {0}: {1}".format(filename, e))
+
+def image_fingerprint():
+    """Returns a fingerprint of the contents of the image
+
+    This is the size of the image with a hash of its header and of
+    blocks sampled evenly through the rest of it, so an image which is
+    acquired again to the same location gets a different fingerprint
+    without having to hash all of it. Fingerprints are stored in the
+    cache directory by filename, size and modification time, so each
+    image is only read once. Images which aren't files are identified
+    by their location.
+    """
+    location = config.LOCATION
+    if not location or not location.startswith("file://"):
+        return location
+
+    filename = urllib.url2pathname(location[7:])
+    try:
+        st = os.stat(filename)
+    except OSError:
+        return location
+
+    key = "{0}:{1}:{2}".format(os.path.abspath(filename), st.st_size, st.st_mtime)
+    if key not in _fingerprints:
+        _load_fingerprints()
+    if key in _fingerprints:
+        return _fingerprints[key]
+
+    h = hashlib.sha1()
+    fd = open(filename, "rb")
+    try:
+        h.update(fd.read(FINGERPRINT_HEADER_SIZE))
+        step = max(st.st_size / FINGERPRINT_SAMPLES, FINGERPRINT_BLOCK_SIZE)
+        for offset in range(FINGERPRINT_HEADER_SIZE, st.st_size, step):
+            fd.seek(offset)
+            h.update(fd.read(FINGERPRINT_BLOCK_SIZE))
+        fd.seek(max(st.st_size - FINGERPRINT_BLOCK_SIZE, 0))
+        h.update(fd.read(FINGERPRINT_BLOCK_SIZE))
+    finally:
+        fd.close()
+
+    result = _fingerprints[key] = "{0}:{1}".format(st.st_size, h.hexdigest())
+    _save_fingerprints()
+    return result
+
+def image_key():
+    """Returns the name the cache for the image is stored under
+
+    This is a hash of the image's fingerprint rather than of its
+    location, so copies of an image share their cache, while different
+    images with the same filename don't.
+    """
+    return hashlib.md5(image_fingerprint()).hexdigest()
+
+def image_url(path):
+    """Returns the URL of the key path, which is based at the image if it's relative"""
+    return urlparse.urljoin(image_key() + "/", path)
+
 class Invalidator(object):
     """ The Invalidator encapsulates program state to control
     invalidation of the cache.
@@ -346,9 +486,22 @@ class Invalidator(object):
     The purpose of the callbacks is to represent a signature of the
     current state of execution. If the signature changes, the cache is
     invalidated.
+
+    Only some of the callbacks go into the signature of a cached
+    result: the fingerprint of the image's contents (see
+    image_fingerprint), the profile and the options used to find the
+    kernel (core_conditions), and any other options the result was
+    declared to depend on, so changing an unrelated option doesn't
+    throw the cache away.
     """
-    def __init__(self):
-        self.callbacks = {}
+    ## The conditions every cached result depends on
+    core_conditions = ['image', 'profile', 'dtb', 'kdbg', 'kpcr', 'shift']
+
+    def __init__(self, depends = None):
+        """Depends is a list of the options (besides the core
+        conditions) the results this invalidates depend on"""
+        self.callbacks = {'image': image_fingerprint}
+        self.depends = [ d.lower().replace("_", "-") for d in (depends or []) ]
 
     def add_condition(self, key, callback):
         """Callback will be stored under key and should return a string.
@@ -360,6 +513,9 @@ class Invalidator(object):
         ## the global cache invalidator. We cant really get away from
         ## having a global invalidator.
         for k, v in CACHE.invalidator.callbacks.items():
+            if k in self.core_conditions and k not in state:
+                raise InvalidCache("Cached result has no {0} in its signature".format(k))
+
             # TODO: Determine what happens if the state or current callbacks
             # contain a key that's not in the other
             if k in state and v() != state[k]:
@@ -369,6 +525,17 @@ class Invalidator(object):
                                    "with pickled environment - "
                                    "invalidating cache.")
 
+        self.callbacks = {}
+        self.depends = [ k for k in state if k not in self.core_conditions ]
+
+    def signature(self):
+        """Returns the signature dict of the conditions we depend on"""
+        result = {}
+        for k, v in CACHE.invalidator.callbacks.items():
+            if k in self.core_conditions or k in self.depends:
+                result[k] = v()
+        return result
+
     def __getstate__(self):
         """When pickling ourselves we call our callbacks to provide a
         dict of strings (our state signature). This dict should
@@ -376,9 +543,7 @@ class Invalidator(object):
         be compared to the state signature when unpickling and if its
         different we invalidate the cache.
         """
-        result = {}
-        for k, v in CACHE.invalidator.callbacks.items():
-            result[k] = v()
+        result = self.signature()
 
         debug.debug("Pickling State signature: {0}".format(result))
 
@@ -406,7 +571,7 @@ class CacheTree(object):
             return None
 
         ## Normalise the path
-        path = urlparse.urljoin(config.LOCATION + "/", path)
+        path = image_url(path)
 
         elements = path.split("/")
         current = self.root
@@ -447,15 +612,16 @@ class CacheStorage(object):
         return result
 
     def filename(self, url):
-        if url.startswith(config.LOCATION):
+        key = image_key()
+        if url.startswith(key + "/"):
             # Encode just the path part, since everything else is taken from relatively safe/already used data
-            path = self.encode(url[len(config.LOCATION):])
+            path = self.encode(url[len(key):])
         else:
             raise exceptions.CacheRelativeURLException("Storing non relative URLs is not supported now ({0})".format(url))
 
         # Join together the bits we need, and abspath it to ensure it's right for the OS it's on
         path = os.path.abspath(os.path.sep.join([config.CACHE_DIRECTORY,
-                                                 os.path.basename(config.LOCATION) + ".cache",
+                                                 key + ".cache",
                                                  path + '.pickle']))
 
         return path
@@ -493,6 +659,391 @@ class CacheStorage(object):
             # Do nothing if the pickle fails
             debug.debug("NOT Dumping filename {0} - contained a non-picklable class".format(filename))
 
+class ResultEncoder(object):
+    """ Converts results to and from values marshal can store
+
+    Primitives, and tuples, lists and dicts of them, are stored as they
+    are. Anything else is stored as a tuple starting with TAG: objects
+    as a reference (their class, type, offset and address space, and
+    the arguments needed to instantiate them again), address spaces as
+    which of the image's spaces they are (the kernel, physical or a
+    process's, by DTB), and NoneObjects by their reason. Anything else
+    can't be stored, and UncacheableResult is raised.
+    """
+    TAG = "\x00vol"
+
+    primitives = (types.NoneType, bool, int, long, float, str, unicode)
+
+    ## Arguments of the object constructors that are stored separately
+    object_args = ['self', 'theType', 'offset', 'vm', 'native_vm', 'parent', 'name',
+                   'members', 'struct_size']
+
+    ## How far to follow the parents of an object
+    max_depth = 32
+
+    def __init__(self):
+        self._spaces = None
+
+    def spaces(self):
+        """Returns the image's (kernel, physical) address spaces"""
+        if self._spaces is None:
+            import volatility.utils as utils
+            kernel = utils.load_as(config)
+            try:
+                physical = utils.load_as(config, astype = 'physical')
+            except exceptions.AddrSpaceError:
+                physical = None
+            self._spaces = (kernel, physical)
+        return self._spaces
+
+    def encode_space(self, vm):
+        # Snapshots are copies of what's in their address space anyway
+        while isinstance(vm, obj.SnapshotVM):
+            vm = vm.vm
+
+        kernel, physical = self.spaces()
+        if vm is kernel:
+            return ('kernel',)
+        if (vm.__class__ is kernel.__class__ and hasattr(vm, 'dtb') and
+                getattr(vm, 'base', None) is getattr(kernel, 'base', None)):
+            return ('dtb', vm.dtb, getattr(vm, 'name', None))
+        if physical is not None and vm == physical:
+            return ('physical',)
+        raise UncacheableResult("Unknown address space {0}".format(vm.__class__.__name__))
+
+    def decode_space(self, ref):
+        kernel, physical = self.spaces()
+        if ref[0] == 'kernel':
+            return kernel
+        if ref[0] == 'physical' and physical is not None:
+            return physical
+        if ref[0] == 'dtb':
+            if hasattr(kernel, "get_process_space"):
+                space = kernel.get_process_space(ref[1])
+            else:
+                space = kernel.__class__(kernel.base, kernel.get_config(), dtb = ref[1])
+            if ref[2] is not None:
+                space.name = ref[2]
+            return space
+        raise InvalidCache("Address space {0} is not available".format(ref[0]))
+
+    def encode_object(self, item, depth):
+        if not isinstance(item.obj_type, (str, types.NoneType)):
+            raise UncacheableResult("Object {0} has no type name".format(item.obj_name))
+        if isinstance(item, obj.CType) and not item.obj_vm.profile.has_type(item.obj_type):
+            raise UncacheableResult("Struct {0} is not in the profile".format(item.obj_type))
+
+        ## The arguments to the constructor are kept in attributes of the same name
+        code = item.__class__.__init__.im_func.func_code
+        args = {}
+        for arg in code.co_varnames[:code.co_argcount]:
+            if arg in self.object_args:
+                continue
+            try:
+                args[arg] = object.__getattribute__(item, arg)
+            except AttributeError:
+                ## Structs are made by the profile, which knows their arguments
+                if not isinstance(item, obj.CType):
+                    raise UncacheableResult("Object {0} has no attribute {1}".format(item.obj_name, arg))
+
+        ## As are any attributes added by overlays (or newattr)
+        extra = dict((k, v) for k, v in object.__getattribute__(item, '__dict__').items()
+                     if k not in args)
+
+        native_vm = object.__getattribute__(item, '_vol_native_vm')
+        return (self.TAG, 'obj', item.__class__.__module__, item.__class__.__name__,
+                item.obj_type, item.obj_offset, self.encode_space(item.obj_vm),
+                native_vm and self.encode_space(native_vm), item.obj_name,
+                self.encode(item.obj_parent, depth + 1),
+                self.encode(args, depth + 1), self.encode(extra, depth + 1))
+
+    def decode_object(self, module, classname, theType, offset, vm, native_vm, name, parent, args, extra):
+        try:
+            __import__(module)
+            cls = getattr(sys.modules[module], classname)
+        except (ImportError, AttributeError, KeyError):
+            raise InvalidCache("Unknown object class {0}.{1}".format(module, classname))
+
+        vm = self.decode_space(vm)
+        kwargs = self.decode(args)
+        kwargs.update(native_vm = native_vm and self.decode_space(native_vm),
+                      parent = self.decode(parent), name = name)
+        try:
+            if issubclass(cls, obj.CType):
+                result = vm.profile.types[theType](offset = offset, vm = vm, **kwargs)
+            else:
+                result = cls(theType, offset, vm, **kwargs)
+        except (obj.InvalidOffsetError, KeyError, TypeError), e:
+            raise InvalidCache("Unable to instantiate {0}: {1}".format(theType, e))
+        if result.__class__ is not cls:
+            raise InvalidCache("{0} is no longer a {1}".format(theType, classname))
+
+        for k, v in self.decode(extra).items():
+            result.newattr(k, v)
+        return result
+
+    def encode(self, item, depth = 0):
+        """Returns item converted to values marshal can store"""
+        if depth > self.max_depth:
+            raise UncacheableResult("Result is nested too deeply")
+        if isinstance(item, self.primitives):
+            return item
+        if isinstance(item, tuple):
+            result = tuple([ self.encode(x, depth + 1) for x in item ])
+            if result and result[0] == self.TAG:
+                result = (self.TAG, 'tuple') + result
+            return result
+        if isinstance(item, list):
+            return [ self.encode(x, depth + 1) for x in item ]
+        if isinstance(item, dict):
+            return dict((self.encode(k, depth + 1), self.encode(v, depth + 1)) for k, v in item.items())
+        if isinstance(item, obj.NoneObject):
+            return (self.TAG, 'none', item.reason)
+        if isinstance(item, obj.BaseObject):
+            return self.encode_object(item, depth)
+        if isinstance(item, functools.partial) and item.func is obj.Object:
+            return (self.TAG, 'curry', self.encode(item.args, depth + 1),
+                    self.encode(item.keywords or {}, depth + 1))
+        if hasattr(item, 'is_valid_address') and hasattr(item, 'base'):
+            return (self.TAG, 'space', self.encode_space(item))
+        raise UncacheableResult("Unable to store {0}".format(item.__class__.__name__))
+
+    def decode(self, item):
+        """Returns the value that encode converted to item"""
+        if isinstance(item, tuple):
+            if not item or item[0] != self.TAG:
+                return tuple([ self.decode(x) for x in item ])
+            kind = item[1]
+            if kind == 'tuple':
+                return tuple([ self.decode(x) for x in item[2:] ])
+            if kind == 'none':
+                return obj.NoneObject(item[2])
+            if kind == 'obj':
+                return self.decode_object(*item[2:])
+            if kind == 'curry':
+                return obj.Curry(obj.Object, *self.decode(item[2]), **self.decode(item[3]))
+            if kind == 'space':
+                return self.decode_space(item[2])
+            raise InvalidCache("Unknown cached value {0}".format(kind))
+        if isinstance(item, list):
+            return [ self.decode(x) for x in item ]
+        if isinstance(item, dict):
+            return dict((self.decode(k), self.decode(v)) for k, v in item.items())
+        return item
+
+class ResultStore(object):
+    """ Stores the results of the cached functions for an image in an
+    SQLite database (the sqlite cache engine).
+
+    Each result is stored under its URL as rows encoded by a
+    ResultEncoder, one for the value returned by a function, or one for
+    each value yielded by a generator. The rows of a generator are
+    written as they are produced, so if it's stopped early the rows so
+    far are kept: the next call yields them from the database, then
+    runs the generator again (skipping the rows it already has) to
+    carry on. Cached rows are read back in batches as they're needed.
+
+    Results are invalidated when any of the options that are cache
+    invalidators change, as with the pickled cache nodes.
+    """
+    ## Bump this when the format of the database changes
+    version = 1
+
+    ## Number of rows to read or write at once
+    batch_size = 256
+
+    VALUE, GENERATOR = 0, 1
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.encoder = ResultEncoder()
+        self.stats = dict(hits = 0, resumed = 0, misses = 0, uncacheable = 0,
+                          rows_read = 0, rows_written = 0)
+        ## The rows not yet written, for each URL being recorded
+        self._pending = {}
+
+        directory = os.path.dirname(filename)
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+        self.db = sqlite3.connect(filename)
+        self.db.text_factory = str
+        if self.db.execute("PRAGMA user_version").fetchone()[0] != self.version:
+            self.db.executescript("""
+                DROP TABLE IF EXISTS results;
+                DROP TABLE IF EXISTS rows;
+                CREATE TABLE results (url TEXT PRIMARY KEY, signature TEXT,
+                                      kind INTEGER, complete INTEGER, count INTEGER);
+                CREATE TABLE rows (url TEXT, seq INTEGER, data BLOB,
+                                   PRIMARY KEY (url, seq));
+                PRAGMA user_version = {0};
+                """.format(self.version))
+        atexit.register(self.close)
+
+    def signature(self, depends):
+        """Returns the state of the conditions a result depends on"""
+        return repr(sorted(Invalidator(depends).signature().items()))
+
+    def close(self):
+        """Writes any pending rows, and reports how the cache did"""
+        if self.db is None:
+            return
+        for url in self._pending.keys():
+            self._flush(url, False)
+        self.db.close()
+        self.db = None
+
+        if self.stats['hits'] + self.stats['resumed'] + self.stats['misses']:
+            debug.info("Cache: {hits} hits, {resumed} resumed, {misses} misses, {uncacheable} uncacheable "
+                       "({rows_read} rows read, {rows_written} written)".format(**self.stats))
+
+    def _delete(self, url):
+        self._pending.pop(url, None)
+        self.db.execute("DELETE FROM rows WHERE url = ?", (url,))
+        self.db.execute("DELETE FROM results WHERE url = ?", (url,))
+        self.db.commit()
+
+    def _start(self, url, signature, kind):
+        self._delete(url)
+        self.db.execute("INSERT INTO results VALUES (?, ?, ?, 0, 0)", (url, signature, kind))
+        self.db.commit()
+        self._pending[url] = []
+
+    def _add(self, url, seq, item):
+        """Encodes and queues a row to be written, returning False if it can't be"""
+        ## Another call may have started recording the result again
+        if url not in self._pending:
+            return False
+        try:
+            data = marshal.dumps(self.encoder.encode(item))
+        except (UncacheableResult, ValueError), e:
+            debug.debug("Not caching {0}: {1}".format(url, e))
+            self.stats['uncacheable'] += 1
+            self._delete(url)
+            return False
+
+        pending = self._pending[url]
+        pending.append((url, seq, sqlite3.Binary(data)))
+        if len(pending) >= self.batch_size:
+            self._flush(url, False)
+        return True
+
+    def _flush(self, url, complete):
+        """Writes the queued rows, and whether that's all of them"""
+        pending = self._pending[url]
+        self.db.executemany("INSERT OR REPLACE INTO rows VALUES (?, ?, ?)", pending)
+        self.db.execute("UPDATE results SET count = count + ?, complete = ? WHERE url = ?",
+                        (len(pending), int(complete), url))
+        self.db.commit()
+        self.stats['rows_written'] += len(pending)
+        if complete:
+            del self._pending[url]
+        else:
+            del pending[:]
+
+    def _rows(self, url, count):
+        """Yields the first count rows stored for url, a batch at a time"""
+        seq = 0
+        while seq < count:
+            batch = self.db.execute("SELECT data FROM rows WHERE url = ? AND seq >= ? ORDER BY seq LIMIT ?",
+                                    (url, seq, min(self.batch_size, count - seq))).fetchall()
+            if not batch:
+                raise InvalidCache("Rows missing from {0}".format(url))
+            for (data,) in batch:
+                self.stats['rows_read'] += 1
+                seq += 1
+                yield self.encoder.decode(marshal.loads(str(data)))
+
+    def _generate(self, url, signature, count, complete, function):
+        """Yields the count stored rows of url, and then unless they're
+        complete, the rest of the rows from function() (storing them)"""
+        position = 0
+        stored = count
+        try:
+            for item in self._rows(url, count):
+                yield item
+                position += 1
+            if complete:
+                return
+        except InvalidCache, e:
+            ## Record them all again, but only yield those we haven't
+            debug.debug("Invalid cache rows for {0}: {1}".format(url, e))
+            self._start(url, signature, self.GENERATOR)
+            stored = 0
+
+        self._pending[url] = []
+        recording = True
+        try:
+            for index, item in enumerate(function()):
+                if recording and index >= stored:
+                    recording = self._add(url, index, item)
+                if index >= position:
+                    yield item
+            if recording:
+                self._flush(url, True)
+        finally:
+            ## Keep the rows so far if the generator is stopped early
+            if url in self._pending:
+                self._flush(url, False)
+                del self._pending[url]
+
+    def call(self, path, depends, f, s, *args, **kwargs):
+        """Returns f(s, *args, **kwargs), stored under path (and
+        invalidated when the options in depends change)"""
+        url = image_url(path)
+        signature = self.signature(depends)
+        function = lambda: f(s, *args, **kwargs)
+
+        row = self.db.execute("SELECT signature, kind, complete, count FROM results WHERE url = ?",
+                              (url,)).fetchone()
+        if row and (row[0] != signature or url in self._pending):
+            row = None
+
+        if row and row[1] == self.VALUE:
+            try:
+                result = list(self._rows(url, 1))[0]
+                self.stats['hits'] += 1
+                return result
+            except InvalidCache, e:
+                debug.debug("Invalid cache value for {0}: {1}".format(url, e))
+        elif row:
+            self.stats['hits' if row[2] else 'resumed'] += 1
+            return self._generate(url, signature, row[3], row[2], function)
+
+        self.stats['misses'] += 1
+        result = function()
+        if isinstance(result, types.GeneratorType):
+            self._start(url, signature, self.GENERATOR)
+            return self._generate(url, signature, 0, False, lambda: result)
+
+        self._start(url, signature, self.VALUE)
+        if self._add(url, 0, result):
+            self._flush(url, True)
+        return result
+
+## The ResultStores in use, by database file and process
+_result_stores = {}
+
+def get_result_store():
+    """Returns the ResultStore for the image if the sqlite cache engine is in use"""
+    if not (config.CACHE and config.CACHE_ENGINE == "sqlite" and config.LOCATION):
+        return None
+    if not has_sqlite:
+        debug.warning("The sqlite cache engine requires the sqlite3 module, using the file cache engine")
+        config.CACHE_ENGINE = "file"
+        return None
+
+    ## Name the database after the image's contents rather than its
+    ## filename, which other images may share
+    filename = os.path.join(config.CACHE_DIRECTORY, image_key() + ".sqlite")
+    ## Connections can't be shared with forked processes
+    key = (filename, os.getpid())
+    try:
+        return _result_stores[key]
+    except KeyError:
+        store = _result_stores[key] = ResultStore(filename)
+        return store
+
 ## This is the central cache object
 CACHE = CacheTree(CacheStorage(), BlockingNode, invalidator = Invalidator())
 
@@ -511,9 +1062,14 @@ config.add_option("CACHE", default = False, action = 'callback',
                   callback = enable_caching,
                   help = "Use caching")
 
+config.add_option("CACHE-ENGINE", default = "file", type = 'choice',
+                  choices = ["file", "sqlite"],
+                  cache_invalidator = False,
+                  help = "How to store the cache: file (a pickle per key) or sqlite (a database per image)")
+
 class CacheDecorator(object):
     """ This decorator will memoise a function in the cache """
-    def __init__(self, path):
+    def __init__(self, path, depends = None):
         """Wraps a function in a cache decorator.
 
         The results of the function will be cached and memoised. Further
@@ -526,6 +1082,11 @@ class CacheDecorator(object):
            it will be called with the function's args and is expected
            to return a string which will be used as a path.
 
+           depends: The options (besides the image, profile and kernel
+           location) the result depends on, other than those already
+           in the path. The result is only invalidated when one of
+           these changes. Like the path, this may be callable.
+
         Returns:
            A decorator.
 
@@ -536,11 +1097,17 @@ class CacheDecorator(object):
            ....
 
         Note the use of the callback to finely tune the cache key depending on external variables.
+        Options which only filter the results can be declared instead:
+
+        @CacheDecorator("tests/dlllist", depends = ['pid'])
+        def calculate(self):
+           ....
         """
         self.path = path
+        self.depends = depends
         self.node = None
 
-    def generate(self, path, g):
+    def generate(self, path, depends, g):
         """ Special handling for generators. We pass each iteration
         back immediately, and keep it in a list. Note that if the
         generator is aborted, the cache is not dumped.
@@ -550,10 +1117,11 @@ class CacheDecorator(object):
             payload.append(x)
             yield x
 
-        self.dump(path, payload)
+        self.dump(path, depends, payload)
 
-    def dump(self, path, payload):
+    def dump(self, path, depends, payload):
         self.node = CACHE[path]
+        self.node.invalidator = Invalidator(depends)
         self.node.set_payload(payload)
         self.node.dump()
 
@@ -565,6 +1133,15 @@ class CacheDecorator(object):
         else:
             path = self.path
 
+        if callable(self.depends):
+            depends = self.depends(s, *args, **kwargs)
+        else:
+            depends = self.depends
+
+        store = get_result_store()
+        if store is not None:
+            return store.call(path, depends, f, s, *args, **kwargs)
+
         ## Check if the result can be retrieved
         self.node = CACHE[path]
         # If this test goes away, we need to change the set_payload exception check
@@ -579,9 +1156,9 @@ class CacheDecorator(object):
         ## If the wrapped function is a generator we need to
         ## handle it especially
         if isinstance(result, types.GeneratorType):
-            return self.generate(path, result)
+            return self.generate(path, depends, result)
 
-        self.dump(path, result)
+        self.dump(path, depends, result)
         return result
 
     def __call__(self, f):
@@ -628,10 +1205,154 @@ class Testable(object):
             return item
 
     ## This forces the test to be memoised with a key name derived from the class name
-    @TestDecorator(lambda self: "tests/unittests/{0}".format(self.__class__.__name__))
+    ## (and since any option may change a plugin's output, invalidated by all of them)
+    @TestDecorator(lambda self: "tests/unittests/{0}".format(self.__class__.__name__),
+                   depends = lambda self: CACHE.invalidator.callbacks.keys())
     def test(self):
         ## This forces iteration over all keys - this is required in order
         ## to flatten the full list for the cache
         ## We must ensure config.CACHE is False here, otherwise the change isn't registered in this module
         config.CACHE = False
         return self._flatten(self.calculate())
+
+config.add_option("NO-PROFILE-CACHE", default = False, action = 'store_true',
+                  cache_invalidator = False,
+                  help = "Always build profiles instead of loading them from, " \
+                         "and storing them in, the cache directory")
+
+class ProfileCache(object):
+    """ Stores built profiles in the cache directory
+
+    Every time a profile is instantiated its vtypes are loaded and all
+    the profile modifications are applied to them (and for Linux
+    profiles, the dwarf data is parsed). Instead, the state of the
+    built profile is pickled into the profiles directory of the cache
+    directory, keyed by a hash of the files it was built from, and
+    loaded on later runs.
+
+    The overlays use many lambdas, and some modifications wrap the
+    profile's own methods, neither of which can be pickled by
+    reference. These are stored as persistent ids instead, with the
+    lambdas as their marshalled code. Modifications which change the
+    profile class itself (such as adding the syscalls property) can't
+    be stored at all, so they are applied again when the profile is
+    loaded.
+    """
+
+    def key(self, profile):
+        """ Returns a hash of everything the state of the profile depends on """
+        h = hashlib.md5()
+        h.update(sys.version)
+        h.update(constants.VERSION)
+        h.update(profile.__class__.__name__)
+        h.update(registry.plugin_signature())
+        for filename in sorted(set(profile.cache_dependencies())):
+            st = os.stat(filename)
+            h.update("{0}:{1}:{2}".format(filename, st.st_mtime, st.st_size))
+        return h.hexdigest()
+
+    def filename(self, profile):
+        """ Returns the cache file for the profile, or None if it shouldn't be cached """
+        # Without a signature for the plugins we can't tell whether any of
+        # the modifications have changed
+        if config.NO_PROFILE_CACHE or not config.CACHE_DIRECTORY or not registry.plugin_signature():
+            return None
+        try:
+            key = self.key(profile)
+        except (EnvironmentError, ImportError), e:
+            debug.debug("Not caching profile {0}: {1}".format(profile.__class__.__name__, e))
+            return None
+        return os.path.join(config.CACHE_DIRECTORY, "profiles",
+                            "{0}-{1}.pickle".format(profile.__class__.__name__, key))
+
+    def _persistent_id(self, profile, item):
+        if item is profile:
+            return ("profile",)
+        if isinstance(item, types.MethodType) and item.im_self is profile:
+            return ("method", item.__name__)
+        if isinstance(item, types.FunctionType):
+            # Functions only get here if they can't be pickled by reference
+            if item.func_closure:
+                raise pickle.PicklingError("Unable to pickle closure {0}".format(item.__name__))
+            return ("function", item.__module__, item.__name__,
+                    marshal.dumps(item.func_code), item.func_defaults)
+        return None
+
+    def _persistent_load(self, profile, pid):
+        if pid[0] == "profile":
+            return profile
+        if pid[0] == "method":
+            return getattr(profile, pid[1])
+        if pid[0] == "function":
+            _kind, module, name, code, defaults = pid
+            __import__(module)
+            return types.FunctionType(marshal.loads(code), sys.modules[module].__dict__, name, defaults)
+        raise pickle.UnpicklingError("Unknown persistent id {0}".format(pid[0]))
+
+    def load(self, profile):
+        """ Restores the profile from the cache, returning whether it succeeded """
+        filename = self.filename(profile)
+        if not filename or not os.path.exists(filename):
+            return False
+
+        try:
+            fd = open(filename, 'rb')
+            try:
+                unpickler = pickle.Unpickler(fd)
+                unpickler.persistent_load = lambda pid: self._persistent_load(profile, pid)
+                state = unpickler.load()
+            finally:
+                fd.close()
+        except Exception, e:
+            # A corrupt or outdated cache file just means rebuilding the profile
+            debug.debug("Unable to load cached profile {0}: {1}".format(filename, e))
+            return False
+
+        try:
+            profile.set_state(state)
+        except Exception, e:
+            debug.debug("Unable to restore cached profile {0}: {1}".format(filename, e))
+            profile.clear()
+            return False
+
+        debug.debug("Loaded cached profile {0}".format(filename))
+        return True
+
+    def save(self, profile):
+        """ Stores the state of the built profile in the cache """
+        filename = self.filename(profile)
+        if not filename:
+            return
+
+        directory = os.path.dirname(filename)
+        tmpname = None
+        try:
+            if not os.path.isdir(directory):
+                os.makedirs(directory)
+
+            # Write to a temporary file first, since other processes may be
+            # loading the same profile
+            fd, tmpname = tempfile.mkstemp(dir = directory)
+            fd = os.fdopen(fd, 'wb')
+            try:
+                pickler = pickle.Pickler(fd, 2)
+                pickler.inst_persistent_id = lambda item: self._persistent_id(profile, item)
+                pickler.dump(profile.get_state())
+            finally:
+                fd.close()
+        except (pickle.PickleError, TypeError, EnvironmentError), e:
+            debug.debug("NOT caching profile {0}: {1}".format(profile.__class__.__name__, e))
+            if tmpname and os.path.exists(tmpname):
+                os.unlink(tmpname)
+            return
+
+        # Remove the files cached for previous versions of the profile
+        for stale in glob.glob(os.path.join(directory, "{0}-*.pickle".format(profile.__class__.__name__))):
+            if stale != filename:
+                try:
+                    os.unlink(stale)
+                except EnvironmentError:
+                    pass
+
+        os.rename(tmpname, filename)
+        debug.debug("Cached profile {0}".format(filename))
@@ -316,7 +316,8 @@ class ConfObject(object):
           option:            The long option name.
           short_option:      An optional short option.
           cache_invalidator: If set, when this option
-                             changes all caches are invalidated.
+                             changes the cached results which depend
+                             on it are invalidated (see cache.Invalidator).
         """
         option = option.lower()
 
@@ -43,6 +43,10 @@ def setup(level = 0):
     for i in range(1, 9):
         logging.addLevelName(logging.DEBUG - i, "DEBUG" + str(i))
 
+def enabled(level = 1):
+    """Returns whether messages at debug level will be logged"""
+    return logging.getLogger('').isEnabledFor(logging.DEBUG + 1 - level)
+
 def debug(msg, level = 1):
     """Logs a message at the DEBUG level"""
     log(msg, logging.DEBUG + 1 - level)
@@ -34,8 +34,10 @@ if __name__ == '__main__':
     sys.path.append("..")
 
 import cPickle as pickle # pickle implementation must match that in volatility.cache
-import struct, copy, operator
+import struct, copy, operator, types
+import os, pkgutil
 import volatility.debug as debug
+import volatility.registry as registry
 import volatility.fmtspec as fmtspec
 import volatility.exceptions as exceptions
 import volatility.plugins.overlays.native_types as native_types
@@ -59,14 +61,24 @@ class NoneObject(object):
     """ A magical object which is like None but swallows bad
     dereferences, __getattribute__, iterators etc to return itself.
 
-    Instantiate with the reason for the error.
+    Instantiate with the reason for the error, or use get_none_object
+    to share one for a common reason.
     """
+    __slots__ = ('reason', 'strict', 'bt')
+
     def __init__(self, reason = '', strict = False):
-        debug.debug("None object instantiated: " + reason, 2)
-        self.reason = reason
-        self.strict = strict
+        # Finding out who's logging is slow, so only log if it'll be seen
+        if debug.enabled(2):
+            debug.debug("None object instantiated: " + reason, 2)
+        object.__setattr__(self, 'reason', reason)
+        object.__setattr__(self, 'strict', strict)
         if strict:
-            self.bt = get_bt_string()
+            object.__setattr__(self, 'bt', get_bt_string())
+
+    def __setattr__(self, attr, value):
+        # Swallow this too (which also means shared NoneObjects can't
+        # be changed by anyone using them)
+        pass
 
     def __str__(self):
         ## If we are strict we blow up here
@@ -157,14 +169,49 @@ class NoneObject(object):
     __ror__ = __call__
 
 
+## NoneObjects shared for common failure reasons, keyed by reason
+_none_objects = {}
+
+def get_none_object(reason, strict = False):
+    """Returns a (shared) NoneObject for reason
+
+    Strict NoneObjects record where they were made, so they are never
+    shared. The cache is emptied if it grows too large, since reasons
+    may name the member or offset involved.
+    """
+    if strict:
+        return NoneObject(reason, strict)
+    try:
+        return _none_objects[reason]
+    except KeyError:
+        if len(_none_objects) >= 4096:
+            _none_objects.clear()
+        result = _none_objects[reason] = NoneObject(reason)
+        return result
+
+## Compiled struct.Struct objects, keyed by format string
+_structs = {}
+
+def get_struct(format_string):
+    """Returns a (shared) compiled struct.Struct for format_string"""
+    try:
+        return _structs[format_string]
+    except KeyError:
+        result = _structs[format_string] = struct.Struct(format_string)
+        return result
+
 class InvalidOffsetError(exceptions.VolatilityException):
     """Simple placeholder to identify invalid offsets"""
     pass
 
-def Object(theType, offset, vm, name = None, **kwargs):
+def Object(theType, offset, vm, name = None, snapshot = False, **kwargs):
     """ A function which instantiates the object named in theType (as
     a string) from the type in profile passing optional args of
     kwargs.
+
+    If snapshot is True and the object is a struct, the struct is
+    read in one go and its members decoded from that copy (see
+    CType.snapshot).
     """
     name = name or theType
     offset = int(offset)
@@ -172,6 +219,8 @@ def Object(theType, offset, vm, name = None, **kwargs):
     try:
         if vm.profile.has_type(theType):
             result = vm.profile.types[theType](offset = offset, vm = vm, name = name, **kwargs)
+            if snapshot and isinstance(result, CType):
+                result = result.snapshot()
             return result
     except InvalidOffsetError:
         ## If we cant instantiate the object here, we just error out:
@@ -182,18 +231,99 @@ def Object(theType, offset, vm, name = None, **kwargs):
     ## This is a serious error.
     debug.warning("Cant find object {0} in profile {1}?".format(theType, vm.profile))
 
+def walk_list(vm, first, link_offset, native_vm = None, seen = None):
+    """ Returns the addresses of the entries in a linked list
+
+    Starting with the entry at first, only the pointer to the next
+    entry (at link_offset within each entry) is read from vm, so no
+    objects are made to walk the list: callers make objects for the
+    addresses they want, when they want them. As when dereferencing
+    pointers, the walk stops at an address which isn't valid in
+    native_vm (vm if not given), or at one which has already been seen
+    (or is in seen, such as the head of a circular list).
+    """
+    native_vm = native_vm or vm
+    size, format_string = vm.profile.native_types['address']
+    unpack = get_struct(format_string).unpack
+    seen = set(seen or ())
+
+    result = []
+    address = first
+    while address not in seen and native_vm.is_valid_address(address):
+        seen.add(address)
+        result.append(address)
+        data = vm.read(address + link_offset, size)
+        if not data or len(data) != size:
+            break
+        address = unpack(data)[0]
+    return result
+
+class SnapshotVM(object):
+    """ A view of an address space in which one range of addresses is
+    served from a copy of the data read when the view was made.
+
+    Reads entirely within the range (and validity checks for addresses
+    in it) don't touch the underlying address space at all. Everything
+    else, including any other attribute of the address space, is passed
+    through to it. Writes go to the underlying address space and update
+    the copy.
+    """
+    def __init__(self, vm, offset, data):
+        self.vm = vm
+        self.start = offset
+        self.end = offset + len(data)
+        self.data = data
+
+    def read(self, addr, length):
+        if self.start <= addr and addr + length <= self.end:
+            return self.data[addr - self.start:addr - self.start + length]
+        return self.vm.read(addr, length)
+
+    def zread(self, addr, length):
+        if self.start <= addr and addr + length <= self.end:
+            return self.data[addr - self.start:addr - self.start + length]
+        return self.vm.zread(addr, length)
+
+    def is_valid_address(self, addr):
+        if self.start <= addr < self.end:
+            return True
+        return self.vm.is_valid_address(addr)
+
+    def write(self, addr, data):
+        result = self.vm.write(addr, data)
+        if result and addr < self.end and addr + len(data) > self.start:
+            self.data = self.vm.zread(self.start, self.end - self.start)
+        return result
+
+    def __getattr__(self, attr):
+        return getattr(self.vm, attr)
+
+    def __eq__(self, other):
+        return self.vm == getattr(other, "vm", other)
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
 class BaseObject(object):
 
+    # Objects are made in their millions, so keep their attributes in
+    # slots. Subclasses (and newattr) can still add attributes of their
+    # own, but the __dict__ for them is only made when they do.
+    __slots__ = ('_vol_theType', '_vol_offset', '_vol_vm', '_vol_native_vm',
+                 '_vol_parent', '_vol_name', '__dict__')
+
     # We have **kwargs here, but it's unclear if it's a good idea
     # Benefit is objects will never fail with duff parameters
     # Downside is typos won't show up and be difficult to diagnose
     def __init__(self, theType, offset, vm, native_vm = None, parent = None, name = None, **kwargs):
-        self._vol_theType = theType
-        self._vol_offset = offset
-        self._vol_vm = vm
-        self._vol_native_vm = native_vm
-        self._vol_parent = parent
-        self._vol_name = name
+        # These are set directly, since subclasses may override __setattr__
+        setattr_ = object.__setattr__
+        setattr_(self, '_vol_theType', theType)
+        setattr_(self, '_vol_offset', offset)
+        setattr_(self, '_vol_vm', vm)
+        setattr_(self, '_vol_native_vm', native_vm)
+        setattr_(self, '_vol_parent', parent)
+        setattr_(self, '_vol_name', name)
 
         if not self.obj_vm.is_valid_address(self.obj_offset):
             raise InvalidOffsetError("Invalid Address 0x{0:08X}, instantiating {1}".format(offset, self.obj_name))
@@ -299,7 +429,7 @@ class BaseObject(object):
         return self.obj_vm.is_valid_address(self.obj_offset)
 
     def dereference(self):
-        return NoneObject("Can't dereference {0}".format(self.obj_name), self.obj_vm.profile.strict)
+        return get_none_object("Can't dereference {0}".format(self.obj_name), self.obj_vm.profile.strict)
 
     def dereference_as(self, derefType, **kwargs):
         # Make sure we use self.obj_native_vm to automatically
@@ -315,7 +445,7 @@ class BaseObject(object):
     def v(self):
         """ Do the actual reading and decoding of this member
         """
-        return NoneObject("No value for {0}".format(self.obj_name), self.obj_vm.profile.strict)
+        return get_none_object("No value for {0}".format(self.obj_name), self.obj_vm.profile.strict)
 
     def __format__(self, formatspec):
         return format(self.v(), formatspec)
@@ -350,8 +480,8 @@ class BaseObject(object):
             for arg in self.__init__.func_code.co_varnames:
                 if (arg not in result and
                     arg not in "self parent profile args".split()):
-                    result[arg] = self.__dict__[arg]
-        except KeyError:
+                    result[arg] = object.__getattribute__(self, arg)
+        except AttributeError:
             debug.post_mortem()
             raise pickle.PicklingError("Object {0} at 0x{1:08x} cannot be cached because of missing attribute {2}".format(self.obj_name, self.obj_offset, arg))
 
@@ -369,7 +499,12 @@ class BaseObject(object):
         ## needed because __setstate__ can not return a new object,
         ## but must update the current object instead. I'm sure ikelos
         ## will object!!! I am open to suggestions ...
-        self.__dict__ = new_object.__dict__
+        for cls in new_object.__class__.__mro__:
+            for attr in cls.__dict__.get('__slots__', ()):
+                try:
+                    object.__setattr__(self, attr, object.__getattribute__(new_object, attr))
+                except AttributeError:
+                    pass
 
 def CreateMixIn(mixin):
     def make_method(name):
@@ -398,6 +533,8 @@ def CreateMixIn(mixin):
 
 class NumericProxyMixIn(object):
     """ This MixIn implements the numeric protocol """
+    __slots__ = ()
+
     _specials = [
         ## Number protocols
         '__add__', '__sub__', '__mul__', '__floordiv__', '__mod__', '__divmod__',
@@ -419,10 +556,12 @@ class NumericProxyMixIn(object):
 CreateMixIn(NumericProxyMixIn)
 
 class NativeType(BaseObject, NumericProxyMixIn):
+    __slots__ = ('format_string',)
+
     def __init__(self, theType, offset, vm, format_string = None, **kwargs):
         BaseObject.__init__(self, theType, offset, vm, **kwargs)
         NumericProxyMixIn.__init__(self)
-        self.format_string = format_string
+        object.__setattr__(self, 'format_string', format_string)
 
     def write(self, data):
         """Writes the data back into the address space"""
@@ -433,14 +572,21 @@ class NativeType(BaseObject, NumericProxyMixIn):
         return self.v()
 
     def size(self):
-        return struct.calcsize(self.format_string)
+        return get_struct(self.format_string).size
 
     def v(self):
-        data = self.obj_vm.read(self.obj_offset, self.size())
-        if not data:
-            return NoneObject("Unable to read {0} bytes from {1}".format(self.size(), self.obj_offset))
+        compiled = get_struct(self.format_string)
+        vm = self._vol_vm
+        offset = self._vol_offset
+        ## Members of a snapshot are unpacked straight from its copy
+        if vm.__class__ is SnapshotVM and vm.start <= offset <= vm.end - compiled.size:
+            (val,) = compiled.unpack_from(vm.data, offset - vm.start)
+        else:
+            data = vm.read(offset, compiled.size)
+            if not data:
+                return NoneObject("Unable to read {0} bytes from {1}".format(compiled.size, offset))
 
-        (val,) = struct.unpack(self.format_string, data)
+            (val,) = compiled.unpack(data)
 
         # Ensure that integer NativeTypes are converted to longs
         # to avoid integer boundaries when doing __rand__ proxying
@@ -462,6 +608,8 @@ class NativeType(BaseObject, NumericProxyMixIn):
 
 class BitField(NativeType):
     """ A class splitting an integer into a bunch of bit. """
+    __slots__ = ('start_bit', 'end_bit', 'native_type')
+
     def __init__(self, theType, offset, vm, start_bit = 0, end_bit = 32, native_type = None, **kwargs):
         # Defaults to profile-endian address, but can be overridden by native_type
         format_string = vm.profile.native_types.get(native_type, vm.profile.native_types['address'])[1]
@@ -480,6 +628,8 @@ class BitField(NativeType):
 
 
 class Pointer(NativeType):
+    __slots__ = ('target',)
+
     def __init__(self, theType, offset, vm, target = None, **kwargs):
         # Default to profile-endian address
         # We don't allow native_type overriding for pointers since we can't dereference invalid pointers anyway
@@ -512,7 +662,7 @@ class Pointer(NativeType):
                                  name = self.obj_name)
             return result
         else:
-            return NoneObject("Pointer {0} invalid".format(self.obj_name), self.obj_vm.profile.strict)
+            return get_none_object("Pointer {0} invalid".format(self.obj_name), self.obj_vm.profile.strict)
 
     def cdecl(self):
         return "Pointer {0}".format(self.v())
@@ -542,6 +692,8 @@ class Pointer(NativeType):
         return result.m(memname)
 
 class Void(NativeType):
+    __slots__ = ()
+
     def __init__(self, theType, offset, vm, **kwargs):
         # Default to profile-endian unsigned long
         # This should never need to be overridden, but can be by changing the 'Void' value in a profile's object_classes
@@ -562,6 +714,8 @@ class Void(NativeType):
 
 class Array(BaseObject):
     """ An array of objects of the same size """
+    __slots__ = ('count', 'original_offset', 'target', 'current')
+
     def __init__(self, theType, offset, vm, parent = None,
                  count = 1, targetType = None, target = None, name = None, **kwargs):
         ## Instantiate the first object on the offset:
@@ -608,6 +762,60 @@ class Array(BaseObject):
 
             yield self[position]
 
+    def values(self):
+        """ Yields the value of each member of the array.
+
+        For arrays of native types (including pointers, which give the
+        address they point to) the members are read and unpacked a page
+        at a time rather than being instantiated one by one. Otherwise,
+        or where the memory can't be read, this is the same as calling
+        v() on each member, so invalid members give NoneObjects.
+        """
+        if not isinstance(self.current, NativeType):
+            for position in xrange(self.count):
+                yield self[position].v()
+            return
+
+        format_string = self.current.format_string
+        element_size = get_struct(format_string).size
+        if format_string[0] in "@=<>!":
+            byte_order, code = format_string[0], format_string[1:]
+        else:
+            byte_order, code = "", format_string
+
+        bitfield = isinstance(self.current, BitField)
+        if bitfield:
+            mask = (1 << self.current.end_bit) - 1
+            shift = self.current.start_bit
+
+        chunk = max(0x1000 / element_size, 1)
+        for start in xrange(0, self.count, chunk):
+            count = min(chunk, self.count - start)
+            data = self.obj_vm.read(self.original_offset + start * element_size, count * element_size)
+            if not data or len(data) != count * element_size:
+                for position in xrange(start, start + count):
+                    yield self[position].v()
+                continue
+
+            if len(code) == 1:
+                values = get_struct(byte_order + str(count) + code).unpack(data)
+            else:
+                compiled = get_struct(format_string)
+                values = [compiled.unpack_from(data, i * element_size)[0] for i in xrange(count)]
+
+            for val in values:
+                if bitfield:
+                    val = (val & mask) >> shift
+                # As NativeType.v does (see issue 265)
+                if isinstance(val, int):
+                    val = long(val)
+                yield val
+
+    def as_list(self):
+        """ Returns the values of the members of the array as a list
+        (see values) """
+        return list(self.values())
+
     def __repr__(self):
         result = [ x.__str__() for x in self ]
         return "<Array {0}>".format(",".join(result))
@@ -654,7 +862,7 @@ class Array(BaseObject):
                                parent = self,
                                name = "{0} {1}".format(self.obj_name, pos))
         else:
-            return NoneObject("Array {0} invalid member {1}".format(self.obj_name, pos),
+            return get_none_object("Array {0} invalid member {1}".format(self.obj_name, pos),
                               self.obj_vm.profile.strict)
 
     def __setitem__(self, pos, value):
@@ -665,24 +873,53 @@ class Array(BaseObject):
 
 class CType(BaseObject):
     """ A CType is an object which represents a c struct """
-    def __init__(self, theType, offset, vm, name = None, members = None, struct_size = 0, **kwargs):
+    __slots__ = ('members', 'struct_size', '_vol_decoders', '_vol_initialized')
+
+    def __init__(self, theType, offset, vm, name = None, members = None, struct_size = 0, decoders = None, **kwargs):
         """ This must be instantiated with a dict of members. The keys
         are the offsets, the values are Curried Object classes that
         will be instantiated when accessed.
+
+        The decoders (see Profile._compile_decoders) are used to make
+        the native and bitfield members directly.
         """
         if not members:
             # Warn rather than raise an error, since some types (_HARDWARE_PTE, for example) are generated without members
             debug.debug("No members specified for CType {0} named {1}".format(theType, name), level = 2)
             members = {}
 
-        self.members = members
-        self.struct_size = struct_size
+        object.__setattr__(self, 'members', members)
+        object.__setattr__(self, '_vol_decoders', decoders or {})
+        object.__setattr__(self, 'struct_size', struct_size)
         BaseObject.__init__(self, theType, offset, vm, name = name, **kwargs)
-        self.__initialized = True
+        object.__setattr__(self, '_vol_initialized', True)
 
     def size(self):
         return self.struct_size
 
+    def snapshot(self):
+        """ Returns a copy of this struct backed by a single read of
+        its memory.
+
+        Members (including nested structs and arrays) are decoded from
+        that copy rather than being read from the address space one at
+        a time, while pointers still dereference into the live address
+        space. If the struct can't be read in one go, we return
+        ourselves.
+        """
+        if isinstance(self.obj_vm, SnapshotVM) or not self.obj_vm.profile.has_type(self.obj_type):
+            return self
+
+        data = self.obj_vm.read(self.obj_offset, self.struct_size)
+        if not data or len(data) != self.struct_size:
+            return self
+
+        return self.obj_vm.profile.types[self.obj_type](offset = self.obj_offset,
+                                                         vm = SnapshotVM(self.obj_vm, self.obj_offset, data),
+                                                         native_vm = self.obj_native_vm,
+                                                         parent = self.obj_parent,
+                                                         name = self.obj_name)
+
     def __repr__(self):
         return "[{0} {1}] @ 0x{2:08X}".format(self.__class__.__name__, self.obj_name or '',
                                      self.obj_offset)
@@ -702,6 +939,17 @@ class CType(BaseObject):
         return long(self.obj_offset)
 
     def m(self, attr):
+        decoder = self._vol_decoders.get(attr, None)
+        if decoder is not None:
+            offset, cls, theType, kwargs = decoder
+            try:
+                return cls(theType, offset + self._vol_offset, self._vol_vm, parent = self,
+                           name = attr, native_vm = self._vol_native_vm or self._vol_vm, **kwargs)
+            except InvalidOffsetError, e:
+                ## Bitfields are otherwise made by the Object factory,
+                ## which honours the profile's strictness
+                return NoneObject(str(e), strict = cls is BitField and self.obj_vm.profile.strict)
+
         if attr in self.members:
             # Allow the element to be a callable rather than a list - this is
             # useful for aliasing member names
@@ -738,9 +986,12 @@ class CType(BaseObject):
     def __setattr__(self, attr, value):
         """Change underlying members"""
         # Special magic to allow initialization
-        if not self.__dict__.has_key('_CType__initialized'):  # this test allows attributes to be set in the __init__ method
+        try:
+            object.__getattribute__(self, '_vol_initialized')
+        except AttributeError:  # this allows attributes to be set in the __init__ method
             return BaseObject.__setattr__(self, attr, value)
-        elif self.__dict__.has_key(attr):       # any normal attributes are handled normally
+        if (isinstance(getattr(self.__class__, attr, None), types.MemberDescriptorType) or
+                self.__dict__.has_key(attr)):  # any normal attributes are handled normally
             return BaseObject.__setattr__(self, attr, value)
         else:
             obj = self.m(attr)
@@ -823,14 +1074,82 @@ def VolMagic(vm):
 ## Profiles are the interface for creating/interpreting
 ## objects
 
+class LazyTypes(dict):
+    """ The compiled types of a profile.
+
+    Native types are added when the profile is compiled, while other
+    types are only compiled (by profile._compile_type) the first time
+    they are looked up. Listing the types compiles all of them.
+    """
+    def __init__(self, profile):
+        dict.__init__(self)
+        self.profile = profile
+
+    def is_compiled(self, name):
+        return dict.__contains__(self, name)
+
+    def __missing__(self, name):
+        result = self.profile._compile_type(name)
+        if result is None:
+            raise KeyError(name)
+        self[name] = result
+        return result
+
+    def __contains__(self, name):
+        return (dict.__contains__(self, name) or name in self.profile.vtypes or
+                name in self.profile.object_classes)
+
+    has_key = __contains__
+
+    def get(self, name, default = None):
+        try:
+            return self[name]
+        except KeyError:
+            return default
+
+    def compile_all(self):
+        for name in self.profile.vtypes.keys() + self.profile.object_classes.keys():
+            if not self.is_compiled(name):
+                self.__missing__(name)
+
+    def keys(self):
+        self.compile_all()
+        return dict.keys(self)
+
+    def values(self):
+        self.compile_all()
+        return dict.values(self)
+
+    def items(self):
+        self.compile_all()
+        return dict.items(self)
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        self.compile_all()
+        return dict.__len__(self)
+
 class Profile(object):
 
     native_mapping = {'32bit': native_types.x86_native_types,
                       '64bit': native_types.x64_native_types}
 
+    # Stores the state of built profiles between runs, installed by the
+    # front end (e.g. vol.py sets a volatility.cache.ProfileCache)
+    state_cache = None
+
+    # The attributes which are rebuilt or set per instance, rather than cached
+    uncached_attributes = ['strict', 'types']
+
+    # The modifications found to change each profile class, by class
+    class_modifications = {}
+
     def __init__(self, strict = False):
         self.strict = strict
         self._mods = []
+        self._class_mods = []
 
         # The "output" variables
         self.types = {}
@@ -863,17 +1182,73 @@ class Profile(object):
         self.vtypes = {'VOLATILITY_MAGIC' : [0x0, {}]}
         # Clear out the ordering that modifications were applied (since now, none were)
         self._mods = []
+        self._class_mods = []
 
     def reset(self):
         """ Resets the profile's vtypes to those automatically loaded """
         # Clear everything out
         self.clear()
+        # Reuse the vtypes and modifications from the profile cache if we can
+        if not (self.state_cache and self.state_cache.load(self)):
+            self.build()
+            if self.state_cache:
+                self.state_cache.save(self)
+        # Recompile
+        self.compile()
+
+    def build(self):
+        """ Loads the vtypes and applies the modifications to them """
         # Setup the initial vtypes and native_types
         self.load_vtypes()
         # Run through any modifications (new vtypes/overlays, object_classes)
         self.load_modifications()
-        # Recompile
-        self.compile()
+
+    def get_state(self):
+        """ Returns the state of the profile after build(), for the profile cache """
+        return dict((k, v) for k, v in self.__dict__.items() if k not in self.uncached_attributes)
+
+    def set_state(self, state):
+        """ Restores the state returned by get_state()
+
+            Modifications which change the profile's class, rather than
+            the profile, are not part of the state, so they are applied
+            again.
+        """
+        self.__dict__.update(state)
+        mods = dict((i.__name__, i) for i in self._get_subclasses(ProfileModification))
+        for modname in self._class_mods:
+            mod = mods.get(modname, None)
+            if not mod:
+                raise RuntimeError("No concrete ProfileModification found for " + modname)
+            debug.debug("Applying class modification from " + modname)
+            mod().modification(self)
+
+    def cache_dependencies(self):
+        """ Returns the files which the state of the profile is built from
+
+            This is the source of the profile classes and the vtypes
+            module. The profile modifications may come from any plugin,
+            so the profile cache also checks the plugin directories
+            (see registry.plugin_signature).
+        """
+        modules = set([c.__module__ for c in self.__class__.__mro__])
+        vtype_module = self.metadata.get('vtype_module', None)
+        if vtype_module:
+            modules.add(vtype_module)
+
+        result = []
+        for name in modules:
+            module = sys.modules.get(name, None)
+            if module:
+                filename = getattr(module, '__file__', None)
+            else:
+                # Find the (lazily imported) vtypes without importing them
+                loader = pkgutil.get_loader(name)
+                filename = loader and loader.get_filename()
+            if filename:
+                source = os.path.splitext(filename)[0] + ".py"
+                result.append(source if os.path.exists(source) else filename)
+        return result
 
     def load_vtypes(self):
         """ Identifies the module from which to load the vtypes 
@@ -888,6 +1263,12 @@ class Profile(object):
         if not vtype_module:
             debug.warning("No vtypes specified for this profile")
         else:
+            # The vtype modules aren't imported with the plugins, but only
+            # when a profile which uses them is instantiated
+            try:
+                __import__(vtype_module)
+            except ImportError, e:
+                debug.warning("Unable to import vtypes module {0}: {1}".format(vtype_module, e))
             module = sys.modules.get(vtype_module, None)
 
             # Try to locate the _types dictionary
@@ -902,6 +1283,9 @@ class Profile(object):
             Allowing the overlay to decide which profile it should act on
         """
 
+        # Make sure the modules defining modifications have been imported
+        registry.import_subclasses(ProfileModification)
+
         # Collect together all the applicable modifications
         mods = {}
         for i in self._get_subclasses(ProfileModification):
@@ -925,7 +1309,15 @@ class Profile(object):
             if mod.check(self):
                 debug.debug("Applying modification from " + mod.__class__.__name__)
                 self._mods.append(mod.__class__.__name__)
+                before = dict(self.__class__.__dict__)
                 mod.modification(self)
+                # Note the modifications which change the class, since the
+                # profile cache has to apply them again
+                class_mods = self.class_modifications.setdefault(self.__class__, set())
+                if [k for k, v in self.__class__.__dict__.items() if before.get(k, None) is not v]:
+                    class_mods.add(modname)
+                if modname in class_mods:
+                    self._class_mods.append(modname)
 
     def compile(self):
         """ Compiles the vtypes, overlays, object_classes, etc into a types dictionary 
@@ -936,20 +1328,27 @@ class Profile(object):
         """
 
         # Load the native types
-        self.types = {}
+        self.types = LazyTypes(self)
         for nt, value in self.native_types.items():
             if type(value) == list:
                 self.types[nt] = Curry(NativeType, nt, format_string = value[1])
 
+        # The vtypes and object_classes are converted into the stubs for
+        # object creation (by the Object factory) the first time each one
+        # is looked up in self.types, see LazyTypes.
+
+    def _compile_type(self, name):
+        """ Returns the compiled type for name, or None if there isn't one """
         # Go through the vtypes, creating the stubs for object creation at
         # a later point by the Object factory
-        for name in self.vtypes.keys():
-            self.types[name] = self._convert_members(name)
+        if name in self.vtypes:
+            return self._convert_members(name)
 
         # Add in any object_classes that had no defined members, for completeness
-        for name in self.object_classes.keys():
-            if name not in self.types:
-                self.types[name] = Curry(self.object_classes[name], name)
+        if name in self.object_classes:
+            return Curry(self.object_classes[name], name)
+
+        return None
 
     @property
     def metadata(self):
@@ -1156,7 +1555,7 @@ class Profile(object):
                          target = self._list_to_type(name, typeList[2], typeDict))
 
         ## This is a list which refers to a type which is already defined
-        if typeList[0] in self.types:
+        if self.types.is_compiled(typeList[0]):
             return Curry(self.types[typeList[0]], name = name)
 
         ## Does it refer to a type which will be defined in future? in
@@ -1215,7 +1614,36 @@ class Profile(object):
         else:
             cls = CType
 
-        return Curry(cls, cname, members = members, struct_size = size)
+        return Curry(cls, cname, members = members, struct_size = size,
+                     decoders = self._compile_decoders(raw_members))
+
+    def _compile_decoders(self, raw_members):
+        """ Builds the decoder table for a struct's members, a dict of
+            member name -> (offset, class, type name, constructor args)
+
+            Only native types and bitfields at fixed offsets are included,
+            and only where they would be made by the NativeType and
+            BitField classes anyway, so CType.m() can make them directly
+            instead of through the Curry and Object factory chain in the
+            members dict.
+        """
+        decoders = {}
+        for k, v in raw_members.items():
+            if callable(v) or not isinstance(v[0], (int, long)):
+                continue
+            try:
+                typename, args = v[1][0], v[1][1:]
+            except (TypeError, IndexError):
+                continue
+
+            if not args and type(self.native_types.get(typename, None)) == list:
+                decoders[k] = (v[0], NativeType, typename,
+                               dict(format_string = self.native_types[typename][1]))
+            elif (typename == 'BitField' and self.object_classes.get('BitField') is BitField and
+                  len(args) == 1 and type(args[0]) == dict):
+                decoders[k] = (v[0], BitField, 'BitField', args[0])
+
+        return decoders
 
 class ProfileModification(object):
     """ Class for modifying profiles for additional functionality """
@@ -112,7 +112,7 @@ class AMD64PagedMemory(paged.AbstractWritablePagedMemory):
         "Bits 2:0 are 0" [Intel]
         '''
         pml4e_paddr = (self.dtb & 0xffffffffff000) | ((vaddr & 0xff8000000000) >> 36)
-        return self.read_long_long_phys(pml4e_paddr)
+        return self.read_cached_entry(pml4e_paddr, self.read_long_long_phys)
 
     def get_pdpi(self, vaddr, pml4e):
         '''
@@ -125,7 +125,7 @@ class AMD64PagedMemory(paged.AbstractWritablePagedMemory):
         "Bits 2:0 are all 0" [Intel]
         '''
         pdpte_paddr = (pml4e & 0xffffffffff000) | ((vaddr & 0x7FC0000000) >> 27)
-        return self.read_long_long_phys(pdpte_paddr)
+        return self.read_cached_entry(pdpte_paddr, self.read_long_long_phys)
 
     def get_1GB_paddr(self, vaddr, pdpte):
         '''
@@ -170,7 +170,13 @@ class AMD64PagedMemory(paged.AbstractWritablePagedMemory):
         Invalid entries should be handled with operating
         system abstractions.
         '''
-        vaddr = long(vaddr)
+        return self.cached_vtop(long(vaddr), self.page_walk)
+
+    def page_walk(self, vaddr):
+        '''
+        This method walks the paging structures to translate
+        vaddr, bypassing the TLB.
+        '''
         retVal = None
         pml4e = self.get_pml4e(vaddr)
         if not self.entry_present(pml4e):
@@ -222,32 +228,27 @@ class AMD64PagedMemory(paged.AbstractWritablePagedMemory):
         are accessible.
         '''
         
-        for pml4e in range(0, 0x200):
-            vaddr = pml4e << 39
-            pml4e_value = self.get_pml4e(vaddr)
+        pml4_table = self.read_entries(self.dtb & 0xffffffffff000, 0x200, entry_size)
+        for pml4e, pml4e_value in enumerate(pml4_table):
             if not self.entry_present(pml4e_value):
                 continue
-            for pdpte in range(0, 0x200):
+            pdpt_table = self.read_entries(pml4e_value & 0xffffffffff000, 0x200, entry_size)
+            for pdpte, pdpte_value in enumerate(pdpt_table):
                 vaddr = (pml4e << 39) | (pdpte << 30)
-                pdpte_value = self.get_pdpi(vaddr, pml4e_value)
                 if not self.entry_present(pdpte_value):
                     continue
                 if self.page_size_flag(pdpte_value):
                     yield (vaddr, 0x40000000)
                     continue
 
-                pgd_curr = self.pdba_base(pdpte_value)
-                for j in range(0, ptrs_per_pae_pgd):
+                pgd_table = self.read_entries(self.pdba_base(pdpte_value), ptrs_per_pae_pgd, entry_size)
+                for j, entry in enumerate(pgd_table):
                     soffset = vaddr + (j * ptrs_per_pae_pgd * ptrs_per_pae_pte * 8)
-                    entry = self.read_long_long_phys(pgd_curr)
-                    pgd_curr = pgd_curr + 8
                     if self.entry_present(entry) and self.page_size_flag(entry):
                         yield (soffset, 0x200000)
                     elif self.entry_present(entry):
-                        pte_curr = entry & 0xFFFFFFFFFF000
-                        for k in range(0, ptrs_per_pae_pte):
-                            pte_entry = self.read_long_long_phys(pte_curr)
-                            pte_curr = pte_curr + 8
+                        pte_table = self.read_entries(entry & 0xFFFFFFFFFF000, ptrs_per_pae_pte, entry_size)
+                        for k, pte_entry in enumerate(pte_table):
                             if self.entry_present(pte_entry):
                                 yield (soffset + k * 0x1000, 0x1000)
 
@@ -32,6 +32,8 @@ class ArmAddressSpace(paged.AbstractWritablePagedMemory):
     checkname = 'ArmValidAS'
     minimum_size = 0x1000
     alignment_gcd = 0x1000
+    # Pages can be as small as 1KB (tiny pages)
+    valid_page_shift = 10
 
     def read_long_phys(self, addr):
         '''
@@ -28,6 +28,8 @@ import volatility.addrspace as addrspace
 import volatility.obj as obj
 import volatility.win32.xpress as xpress
 import struct
+import collections
+import multiprocessing
 
 
 #pylint: disable-msg=C0111
@@ -36,24 +38,41 @@ PAGE_SIZE = 0x1000
 page_shift = 12
 
 class Store(object):
-    def __init__(self, limit = 50):
+    """A least recently used cache of items, bounded by their total size"""
+    def __init__(self, limit = 50 * 0x10000):
         self.limit = limit
-        self.cache = {}
-        self.seq = []
+        self.cache = collections.OrderedDict()
         self.size = 0
 
     def put(self, key, item):
+        if key in self.cache:
+            self.size -= len(self.cache.pop(key))
         self.cache[key] = item
         self.size += len(item)
 
-        self.seq.append(key)
-        if len(self.seq) >= self.limit:
-            key = self.seq.pop(0)
-            self.size -= len(self.cache[key])
-            del self.cache[key]
+        while self.size > self.limit and len(self.cache) > 1:
+            _, old = self.cache.popitem(last = False)
+            self.size -= len(old)
 
     def get(self, key):
-        return self.cache[key]
+        item = self.cache.pop(key)
+        ## Move it to the most recently used end
+        self.cache[key] = item
+        return item
+
+def decode_block(args):
+    """Decompresses an xpress block, returning (page number, data) for
+    each page in it. This runs in the worker processes of
+    WindowsHiberFileSpace32.decompress_pages, so takes a single tuple."""
+    BlockSize, data, pages = args
+    if BlockSize != 0x10000:
+        data = xpress.xpress_decode(data)
+
+    result = []
+    for PageNumber, XpressPage in pages:
+        page = data[XpressPage * 0x1000:XpressPage * 0x1000 + 0x1000]
+        result.append((PageNumber, page + "\0" * (0x1000 - len(page))))
+    return result
 
 class WindowsHiberFileSpace32(addrspace.BaseAddressSpace):
     """ This is a hibernate address space for windows hibernation files.
@@ -74,7 +93,7 @@ class WindowsHiberFileSpace32(addrspace.BaseAddressSpace):
         self.PageIndex = 0
         self.AddressList = []
         self.LookupCache = {}
-        self.PageCache = Store(50)
+        self.PageCache = Store(config.HIBER_CACHE * 1024 * 1024)
         self.MemRangeCnt = 0
         self.entry_count = 0xFF
 
@@ -105,6 +124,11 @@ class WindowsHiberFileSpace32(addrspace.BaseAddressSpace):
         # until it's absolutely necessary and/or convert it into a generator...
         self.build_page_cache()
 
+    @staticmethod
+    def register_options(config):
+        config.add_option("HIBER-CACHE", type = 'int', default = 32,
+                          help = "Size (in MB) of the cache of decompressed hibernation file blocks")
+
     def _get_first_table_page(self):
         if self.header != None:
             return self.header.FirstTablePage
@@ -215,6 +239,41 @@ class WindowsHiberFileSpace32(addrspace.BaseAddressSpace):
             return Size
         return (Size & ~7) + 8
 
+    def decompress_pages(self, workers = 1, batch = 256):
+        """Generates (page number, data) for every page in the file,
+        decompressing the xpress blocks in parallel if workers > 1.
+
+        The compressed blocks are read here and handed to the workers
+        a batch at a time, so only a few batches are held in memory.
+        """
+        def blocks():
+            for hoffset in sorted(self.PageDict.keys()):
+                pages = self.PageDict[hoffset]
+                BlockSize = pages[0][1]
+                data = self.base.zread(hoffset + 0x20, BlockSize)
+                yield BlockSize, data, [ (page, xpage) for page, _size, xpage in pages ]
+
+        if workers <= 1:
+            for block in blocks():
+                for page in decode_block(block):
+                    yield page
+            return
+
+        pool = multiprocessing.Pool(workers)
+        try:
+            todo = blocks()
+            while True:
+                chunk = [ b for _, b in zip(xrange(batch), todo) ]
+                if not chunk:
+                    break
+                for pages in pool.imap(decode_block, chunk):
+                    for page in pages:
+                        yield page
+            pool.close()
+        finally:
+            pool.terminate()
+            pool.join()
+
     def get_header(self):
         return self.header
 
@@ -150,18 +150,14 @@ class IA32PagedMemory(paged.AbstractWritablePagedMemory):
         return longval
 
     def get_available_pages(self):
-        pgd_curr = self.dtb
-        for i in range(0, ptrs_per_pgd):
+        pgd_table = self.read_entries(self.dtb, ptrs_per_pgd, pointer_size)
+        for i, entry in enumerate(pgd_table):
             start = (i * ptrs_per_pgd * ptrs_per_pte * 4)
-            entry = self.read_long_phys(pgd_curr)
-            pgd_curr = pgd_curr + 4
             if self.entry_present(entry) and self.page_size_flag(entry):
                 yield (start, 0x400000)
             elif self.entry_present(entry):
-                pte_curr = entry & ~((1 << page_shift) - 1)
-                for j in range(0, ptrs_per_pte):
-                    pte_entry = self.read_long_phys(pte_curr)
-                    pte_curr = pte_curr + 4
+                pte_table = self.read_entries(entry & ~((1 << page_shift) - 1), ptrs_per_pte, pointer_size)
+                for j, pte_entry in enumerate(pte_table):
                     if self.entry_present(pte_entry):
                         yield (start + j * 0x1000, 0x1000)
 
@@ -197,7 +193,7 @@ class IA32PagedMemoryPae(IA32PagedMemory):
 
     def get_pdpi(self, vaddr):
         pdpi_entry = self.get_pdptb(self.dtb) + self.pdpi_index(vaddr) * entry_size
-        return self._read_long_long_phys(pdpi_entry)
+        return self.read_cached_entry(pdpi_entry, self._read_long_long_phys)
 
     def pde_index(self, vaddr):
         return (vaddr >> pde_shift) & (ptrs_per_pde - 1)
@@ -229,6 +225,9 @@ class IA32PagedMemoryPae(IA32PagedMemory):
         return (pgd_entry & 0xFFFFFFFE00000) | (vaddr & ~((ptrs_page - 1) << 21))
 
     def vtop(self, vaddr):
+        return self.cached_vtop(long(vaddr), self.page_walk)
+
+    def page_walk(self, vaddr):
         retVal = None
         pdpe = self.get_pdpi(vaddr)
 
@@ -258,29 +257,23 @@ class IA32PagedMemoryPae(IA32PagedMemory):
 
     def get_available_pages(self):
 
-        pdpi_base = self.get_pdptb(self.dtb)
+        pdpi_table = self.read_entries(self.get_pdptb(self.dtb), ptrs_per_pdpi, entry_size)
 
-        for i in range(0, ptrs_per_pdpi):
+        for i, pdpe in enumerate(pdpi_table):
 
             start = (i * ptrs_per_pae_pgd * ptrs_per_pae_pgd * ptrs_per_pae_pte * 8)
-            pdpi_entry = pdpi_base + i * entry_size
-            pdpe = self._read_long_long_phys(pdpi_entry)
 
             if not self.entry_present(pdpe):
                 continue
 
-            pgd_curr = self.pdba_base(pdpe)
+            pgd_table = self.read_entries(self.pdba_base(pdpe), ptrs_per_pae_pgd, entry_size)
 
-            for j in range(0, ptrs_per_pae_pgd):
+            for j, entry in enumerate(pgd_table):
                 soffset = start + (j * ptrs_per_pae_pgd * ptrs_per_pae_pte * 8)
-                entry = self._read_long_long_phys(pgd_curr)
-                pgd_curr = pgd_curr + 8
                 if self.entry_present(entry) and self.page_size_flag(entry):
                     yield (soffset, 0x200000)
                 elif self.entry_present(entry):
-                    pte_curr = entry & ~((1 << page_shift) - 1)
-                    for k in range(0, ptrs_per_pae_pte):
-                        pte_entry = self._read_long_long_phys(pte_curr)
-                        pte_curr = pte_curr + 8
+                    pte_table = self.read_entries(entry & ~((1 << page_shift) - 1), ptrs_per_pae_pte, entry_size)
+                    for k, pte_entry in enumerate(pte_table):
                         if self.entry_present(pte_entry):
                             yield (soffset + k * 0x1000, 0x1000)
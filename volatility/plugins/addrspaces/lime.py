@@ -90,3 +90,8 @@ class LimeAddressSpace(addrspace.AbstractRunBasedMemory):
             addr = firstram + addr
 
         return addrspace.AbstractRunBasedMemory.translate(self, addr)
+
+    def translate_contiguous(self, addr, length):
+        # Go through our translate, one alloc at a time, to keep the
+        # remapping of addresses below the first run
+        return addrspace.AbstractDiscreteAllocMemory.translate_contiguous(self, addr, length)
@@ -18,8 +18,11 @@
 #
 
 #import fractions
+import struct
+import collections
 import volatility.addrspace as addrspace
 import volatility.obj as obj
+import volatility.cache as cache
 
 class AbstractPagedMemory(addrspace.AbstractVirtualAddressSpace):
     """ Class to handle all the details of a paged virtual address space
@@ -28,10 +31,36 @@ class AbstractPagedMemory(addrspace.AbstractVirtualAddressSpace):
     """
     checkname = "Intel"
 
+    ## The maximum number of page translations (and separately, of paging
+    ## structure entries) cached by the TLB. When full the cache is
+    ## simply emptied. Set to 0 to disable caching.
+    tlb_size = 0x10000
+
+    ## Whether addresses are valid is cached for pages of this size
+    ## (as a shift), along with the TLB
+    valid_page_shift = 12
+
+    ## The maximum number of process address spaces kept by
+    ## get_process_space, evicting the least recently used
+    process_space_cache_size = 64
+
     def __init__(self, base, config, dtb = 0, skip_as_check = False, *args, **kwargs):
         ## We must be stacked on someone else:
         self.as_assert(base, "No base Address Space")
 
+        ## The hit/miss counters are only for measuring the TLB
+        self.tlb_hits = 0
+        self.tlb_misses = 0
+        self._tlb = {}
+        self._valid_pages = {}
+        ## Paging structure entries are cached by physical address, so
+        ## the cache is shared with all the process spaces created by
+        ## get_process_space (as is the list of their TLBs and page
+        ## validity caches, to flush)
+        self._entry_cache = {}
+        self._tlbs = [self._tlb, self._valid_pages]
+        self._process_spaces = collections.OrderedDict()
+
         addrspace.AbstractVirtualAddressSpace.__init__(self, base, config, *args, **kwargs)
 
         ## We can not stack on someone with a dtb
@@ -65,13 +94,19 @@ class AbstractPagedMemory(addrspace.AbstractVirtualAddressSpace):
             return self.base.dtb
         except AttributeError:
             ## Ok so we need to find our dtb ourselves:
-            dtb = obj.VolMagic(self.base).DTB.v()
+            dtb = self._find_dtb()
             if dtb:
                 ## Make sure to save dtb for other AS's
                 ## Will this have an effect on following ASes attempts if this fails?
                 self.base.dtb = dtb
                 return dtb
 
+    ## The DTB is stored in the cache, so the image is only searched
+    ## for it once
+    @cache.CacheDecorator(lambda self: "kernel/{0}/dtb".format(self._config.PROFILE))
+    def _find_dtb(self):
+        return obj.VolMagic(self.base).DTB.v()
+
     def __getstate__(self):
         result = addrspace.BaseAddressSpace.__getstate__(self)
         result['dtb'] = self.dtb
@@ -87,10 +122,125 @@ class AbstractPagedMemory(addrspace.AbstractVirtualAddressSpace):
         """Abstract function that converts virtual (paged) addresses to physical addresses"""
         pass
 
+    def flush_tlb(self):
+        """Discards all cached translations and paging structure entries,
+        including those of the address spaces sharing our caches"""
+        for tlb in self._tlbs:
+            tlb.clear()
+        self._entry_cache.clear()
+
+    def get_process_space(self, dtb):
+        """Returns an address space like this one for the given DTB.
+
+        The spaces are cached by DTB, so all the objects of a process
+        share one address space (and its TLB). Since we have already
+        passed the valid AS check, it is not repeated for each process;
+        the DTB just needs to be in the physical address space.
+        """
+        try:
+            ## Move it to the end, as the most recently used
+            space = self._process_spaces.pop(dtb)
+            self._process_spaces[dtb] = space
+            return space
+        except KeyError:
+            pass
+
+        self.as_assert(self.base.is_valid_address(dtb), "DTB is not a valid physical address")
+
+        while len(self._process_spaces) >= max(self.process_space_cache_size, 1):
+            _dtb, evicted = self._process_spaces.popitem(last = False)
+            self._release_tlb(evicted)
+
+        space = self.__class__(self.base, self.get_config(), dtb = dtb, skip_as_check = True)
+        space._entry_cache = self._entry_cache
+        space._tlbs = self._tlbs
+        space._tlbs.extend([space._tlb, space._valid_pages])
+        space._process_spaces = self._process_spaces
+        self._process_spaces[dtb] = space
+        return space
+
+    def _release_tlb(self, space):
+        """Stops an address space evicted by get_process_space from caching
+
+        Its TLB and page validity cache are no longer flushed along
+        with ours, so objects still using the space carry on without
+        them rather than with translations that may go stale.
+        """
+        self._tlbs[:] = [tlb for tlb in self._tlbs
+                         if tlb is not space._tlb and tlb is not space._valid_pages]
+        space._tlb.clear()
+        space._valid_pages.clear()
+        space.tlb_size = 0
+
+    def cached_vtop(self, vaddr, page_walk):
+        """Translates vaddr using the TLB.
+
+        On a miss page_walk is called with the address of the start of
+        the 4KB page containing vaddr, and its result is cached. Large
+        pages are cached one 4KB page at a time, since the offset within
+        a page is the same whatever the size of the page.
+        """
+        page = vaddr >> 12
+        try:
+            paddr = self._tlb[page]
+            self.tlb_hits += 1
+        except KeyError:
+            self.tlb_misses += 1
+            paddr = page_walk(page << 12)
+            if self.tlb_size:
+                if len(self._tlb) >= self.tlb_size:
+                    self._tlb.clear()
+                self._tlb[page] = paddr
+                if paddr == None and self.valid_page_shift == 12:
+                    self._cache_validity(page, False)
+
+        if paddr == None:
+            return None
+        return paddr | (vaddr & 0xfff)
+
+    def read_cached_entry(self, paddr, read):
+        """Returns the paging structure entry at paddr, calling read(paddr) if it is not cached"""
+        try:
+            return self._entry_cache[paddr]
+        except KeyError:
+            entry = read(paddr)
+            if self.tlb_size:
+                if len(self._entry_cache) >= self.tlb_size:
+                    self._entry_cache.clear()
+                self._entry_cache[paddr] = entry
+            return entry
+
     def get_available_pages(self):
         """A generator that returns (addr, size) for each of the virtual addresses present, sorted by offset"""
         pass
 
+    def read_entries(self, paddr, count, size):
+        """Reads count little endian paging structure entries of size
+        bytes (4 or 8) from the physical address paddr in a single read.
+
+        If the table can't be read in one go, the entries are read one
+        at a time and those that can't be read are returned as NoneObjects.
+        """
+        fmt = '<{0}{1}'.format(count, 'Q' if size == 8 else 'I')
+        try:
+            data = self.base.read(paddr, count * size)
+        except IOError:
+            data = None
+        if data and len(data) == count * size:
+            return struct.unpack(fmt, data)
+
+        entries = []
+        for i in range(count):
+            try:
+                data = self.base.read(paddr + i * size, size)
+            except IOError:
+                data = None
+            if data and len(data) == size:
+                entries.append(struct.unpack(fmt[0] + fmt[-1], data)[0])
+            else:
+                entries.append(obj.NoneObject("Unable to read entry at " + hex(paddr + i * size)))
+        return entries
+
     def get_available_allocs(self):
         return self.get_available_pages()
 
@@ -113,17 +263,48 @@ class AbstractPagedMemory(addrspace.AbstractVirtualAddressSpace):
             yield (currentOffset, runLength)
         raise StopIteration
 
+    def _cache_validity(self, page, valid):
+        if len(self._valid_pages) >= self.tlb_size:
+            self._valid_pages.clear()
+        self._valid_pages[page] = valid
+
     def is_valid_address(self, vaddr):
-        """Returns whether a virtual address is valid"""
+        """Returns whether a virtual address is valid
+
+        The answer is cached for the whole page (whether it's valid or
+        not), so we only translate an address, and check the physical
+        address is in the base, the first time a page is looked at.
+        """
         if vaddr == None or vaddr < 0:
             return False
+        page = long(vaddr) >> self.valid_page_shift
+        try:
+            return self._valid_pages[page]
+        except KeyError:
+            pass
+
         try:
             paddr = self.vtop(vaddr)
         except BaseException:
             return False
         if paddr == None:
-            return False
-        return self.base.is_valid_address(paddr)
+            valid = False
+        else:
+            valid = self.base.is_valid_address(paddr)
+            ## Only cache the answer if it's the same for the whole
+            ## page (it may not be at the end of the base)
+            start = page << self.valid_page_shift
+            end = start + (1 << self.valid_page_shift) - 1
+            try:
+                if (valid != self.base.is_valid_address(self.vtop(start)) or
+                        valid != self.base.is_valid_address(self.vtop(end))):
+                    return valid
+            except BaseException:
+                return valid
+
+        if self.tlb_size:
+            self._cache_validity(page, valid)
+        return valid
 
 class AbstractWritablePagedMemory(AbstractPagedMemory):
     """
@@ -155,6 +336,8 @@ class AbstractWritablePagedMemory(AbstractPagedMemory):
             if paddr is None:
                 return False
             result = self.base.write(paddr, buf[:datalen])
+            ## The data may have been part of the page tables
+            self.flush_tlb()
             if not result:
                 return False
             buf = buf[datalen:]
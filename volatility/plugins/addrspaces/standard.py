@@ -25,6 +25,7 @@
 
 """ These are standard address spaces supported by Volatility """
 import struct
+import mmap
 import volatility.addrspace as addrspace
 import volatility.debug as debug #pylint: disable-msg=W0611
 import urllib
@@ -84,6 +85,18 @@ class FileAddressSpace(addrspace.BaseAddressSpace):
         self.fhandle.seek(0, 2)
         self.fsize = self.fhandle.tell()
 
+        ## Read-only images are memory mapped so that reads are served
+        ## straight from the page cache rather than costing a seek and
+        ## a read syscall each. Writable images, empty or special files,
+        ## images too large to map (e.g. on a 32-bit python) and layered
+        ## subclasses (which override read) use the file handle instead.
+        self.fmap = None
+        if not config.WRITE and not layered and self.fsize > 0:
+            try:
+                self.fmap = mmap.mmap(self.fhandle.fileno(), 0, access = mmap.ACCESS_READ)
+            except (EnvironmentError, OverflowError, ValueError), e:
+                debug.debug("Unable to mmap {0}, using file reads: {1}".format(self.fname, e))
+
     # Abstract Classes cannot register options, and since this checks config.WRITE in __init__, we define the option here
     @staticmethod
     def register_options(config):
@@ -96,8 +109,11 @@ class FileAddressSpace(addrspace.BaseAddressSpace):
 
     def read(self, addr, length):
         addr, length = int(addr), int(length)
-        self.fhandle.seek(addr)
-        data = self.fhandle.read(length)
+        if self.fmap is not None and addr >= 0:
+            data = self.fmap[addr:addr + length]
+        else:
+            self.fhandle.seek(addr)
+            data = self.fhandle.read(length)
         if len(data) == 0:
             return None
         return data
@@ -111,6 +127,9 @@ class FileAddressSpace(addrspace.BaseAddressSpace):
         return data
 
     def read_long(self, addr):
+        if self.fmap is not None and 0 <= addr <= self.fsize - 4:
+            (longval,) = struct.unpack_from('=I', self.fmap, int(addr))
+            return longval
         string = self.read(addr, 4)
         (longval,) = struct.unpack('=I', string)
         return longval
@@ -126,6 +145,9 @@ class FileAddressSpace(addrspace.BaseAddressSpace):
         return 0 <= addr < self.fsize
 
     def close(self):
+        if self.fmap is not None:
+            self.fmap.close()
+            self.fmap = None
         self.fhandle.close()
 
     def write(self, addr, data):
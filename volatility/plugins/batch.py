@@ -0,0 +1,210 @@
+# Volatility
+#
+# This file is part of Volatility.
+#
+# Volatility is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# Volatility is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Volatility.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import os
+import time
+import shlex
+import optparse
+import traceback
+import multiprocessing
+import volatility.commands as commands
+import volatility.registry as registry
+import volatility.utils as utils
+import volatility.debug as debug
+import volatility.win32.tasks as tasks
+
+## The Batch command in the worker processes (which inherit its
+## loaded image when they are forked)
+_worker_batch = None
+
+def _run_job(job):
+    return _worker_batch.run_job(job)
+
+class Batch(commands.Command):
+    """Run many plugins against the image, loading it only once
+
+    The plugins to run are listed after batch on the command line, and/or
+    in a file (--batch-file) with one plugin per line followed by its own
+    options, for example:
+
+        # comments and blank lines are ignored
+        dlllist --pid=4
+        handles -t Process
+
+    The address space (and with it the profile, DTB and, for Windows, the
+    KDBG) is found once and then shared by all of the plugins, each of
+    which writes its output to its own file in --output-dir.
+    """
+
+    def __init__(self, config, *args, **kwargs):
+        commands.Command.__init__(self, config, *args, **kwargs)
+        config.add_option("BATCH-FILE", default = None, type = 'str',
+                          cache_invalidator = False,
+                          help = "File listing the plugins (and their options) to run, one per line")
+        config.add_option("OUTPUT-DIR", default = None, type = 'str',
+                          cache_invalidator = False,
+                          help = "Directory to write the output of each plugin to")
+        config.add_option("BATCH-WORKERS", default = 1, type = 'int',
+                          cache_invalidator = False,
+                          help = "Number of processes to run the plugins in")
+        self.addr_space = None
+
+    def get_jobs(self):
+        """Returns a list of (index, plugin name, options) to run"""
+        lines = []
+        args = list(self._config.args or [])
+        if 'batch' in args:
+            lines.extend(args[args.index('batch') + 1:])
+
+        if self._config.BATCH_FILE:
+            fd = open(self._config.BATCH_FILE)
+            lines.extend(fd.readlines())
+            fd.close()
+
+        jobs = []
+        for line in lines:
+            tokens = shlex.split(line, comments = True)
+            if tokens:
+                jobs.append((len(jobs), tokens[0].lower(), tokens[1:]))
+        return jobs
+
+    def parse_options(self, args):
+        """Parses a plugin's own options into a dict of option values"""
+        parser = optparse.OptionParser(add_help_option = False)
+        for option in self._config.optparser.option_list:
+            if option.dest != 'help':
+                parser.add_option(option)
+
+        def error(msg):
+            raise ValueError(msg)
+        parser.error = error
+
+        values, extra = parser.parse_args(args, optparse.Values())
+        if extra:
+            raise ValueError("Unexpected arguments: {0}".format(" ".join(extra)))
+        return vars(values)
+
+    def load_image(self):
+        """Loads the address space, and saves what it took to find it in the
+           config so that no plugin has to search for it again"""
+        self.addr_space = utils.load_as(self._config)
+
+        dtb = getattr(self.addr_space, 'dtb', None)
+        if dtb and not self._config.DTB:
+            self._config.update('DTB', dtb)
+
+        if self.addr_space.profile.metadata.get('os', 'unknown') == 'windows' and not self._config.KDBG:
+            try:
+                kdbg = tasks.get_kdbg(self.addr_space)
+            except StopIteration:
+                # Raised when there's no KPCR to fall back on, which would
+                # otherwise silently end calculate
+                kdbg = None
+            if kdbg:
+                self._config.update('KDBG', kdbg.obj_offset)
+
+        # Load it again with the DTB set, since that's what the plugins will
+        # ask for, so they all find it in the address space cache
+        self.addr_space = utils.load_as(self._config)
+
+    def output_filename(self, index, name):
+        ext = "txt" if self._config.OUTPUT == "text" else self._config.OUTPUT
+        return os.path.join(self._config.OUTPUT_DIR, "{0:03d}-{1}.{2}".format(index, name, ext))
+
+    def run_job(self, job):
+        """Runs one plugin, returning (name, status, seconds, output file)"""
+        index, name, args = job
+        filename = self.output_filename(index, name)
+
+        # The options are changed for each plugin, so put them back afterwards
+        saved = dict(self._config.readonly)
+        start = time.time()
+        try:
+            try:
+                cls = registry.get_plugin_class(commands.Command, name, lower = True)
+                if not cls or cls == self.__class__:
+                    raise ValueError("No such plugin {0}".format(name))
+
+                command = cls(self._config)
+                for option, value in self.parse_options(args).items():
+                    self._config.update(option, value)
+                filename = self.output_filename(index, name)
+                self._config.update('OUTPUT_FILE', filename)
+
+                command.execute()
+                status = "OK"
+            except (Exception, SystemExit), e:
+                # Plugins give up with debug.error, which exits
+                status = "Failed: {0}".format(e.__class__.__name__ if isinstance(e, SystemExit) else e)
+                fd = open(filename + ".err", "w")
+                fd.write(traceback.format_exc())
+                fd.close()
+        finally:
+            self._config.readonly.clear()
+            self._config.readonly.update(saved)
+
+        return name, status, time.time() - start, filename
+
+    def run_jobs(self, jobs):
+        """Runs the jobs, in worker processes if requested (and possible)"""
+        workers = min(self._config.BATCH_WORKERS, len(jobs))
+        if workers <= 1 or not hasattr(os, 'fork'):
+            for job in jobs:
+                yield self.run_job(job)
+            return
+
+        # The workers are forked now, so they share the loaded image
+        global _worker_batch
+        _worker_batch = self
+        pool = multiprocessing.Pool(workers)
+        try:
+            for result in pool.imap(_run_job, jobs):
+                yield result
+            pool.close()
+        except:
+            pool.terminate()
+            raise
+        finally:
+            pool.join()
+            _worker_batch = None
+
+    def calculate(self):
+        jobs = self.get_jobs()
+        if not jobs:
+            debug.error("Please list the plugins to run after batch, or in a file (--batch-file)")
+        if not self._config.OUTPUT_DIR:
+            debug.error("Please specify a directory for the output of the plugins (--output-dir)")
+        if not os.path.isdir(self._config.OUTPUT_DIR):
+            os.makedirs(self._config.OUTPUT_DIR)
+
+        start = time.time()
+        self.load_image()
+        yield "(load image)", "OK", time.time() - start, ""
+
+        for result in self.run_jobs(jobs):
+            yield result
+
+    def render_text(self, outfd, data):
+        self.table_header(outfd, [("Plugin", "20"),
+                                  ("Time", ">8"),
+                                  ("Output", "40"),
+                                  ("Status", ""),
+                                  ])
+        for name, status, seconds, filename in data:
+            self.table_row(outfd, name, "{0:.2f}s".format(seconds), filename, status)
+            outfd.flush()
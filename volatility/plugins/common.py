@@ -20,18 +20,34 @@
 #
 
 """ This plugin contains CORE classes used by lots of other plugins """
+import struct
 import volatility.scan as scan
 import volatility.obj as obj
 import volatility.debug as debug #pylint: disable-msg=W0611
 import volatility.commands as commands
+import volatility.utils as utils
+import volatility.win32.kernel as kernel
 
 #pylint: disable-msg=C0111
 
+try:
+    import numpy
+    has_numpy = True
+except ImportError:
+    has_numpy = False
+
 class AbstractWindowsCommand(commands.Command):
     @staticmethod
     def is_valid_profile(profile):
         return profile.metadata.get('os', 'unknown') == 'windows'
 
+    def kernel_context(self, addr_space = None):
+        """Returns the KernelContext (the KDBG, processes and modules)
+        for the kernel address space, or for addr_space if given"""
+        if addr_space is None:
+            addr_space = utils.load_as(self._config)
+        return kernel.get_context(addr_space)
+
 def pool_align(vm, object_name, align):
     """Returns the size of the object accounting for pool alignment."""
     size_of_obj = vm.profile.get_obj_size(object_name)
@@ -43,6 +59,91 @@ def pool_align(vm, object_name, align):
 
     return size_of_obj
 
+class PoolHeaderFields(object):
+    """ Decodes the _POOL_HEADER bit fields used by the pool scanner
+    checks for a batch of pool tags found in a block of data.
+
+    The layout is taken from the profile once, and the values are then
+    unpacked straight out of the data (with numpy where available)
+    rather than instantiating a _POOL_HEADER for every tag.
+    """
+    def __init__(self, profile):
+        self.tag_offset = profile.get_obj_offset('_POOL_HEADER', 'PoolTag')
+        members = profile.vtypes['_POOL_HEADER'][1]
+
+        self.fields = {}
+        self.start = 0
+        self.end = 0
+        for name in ['PoolIndex', 'BlockSize', 'PoolType']:
+            offset, (_, args) = members[name]
+            native_type = args.get('native_type') or 'address'
+            fmt = profile.native_types[native_type][1]
+            mask = (1 << args.get('end_bit', 32)) - 1
+            # Fields are relative to the pool tag
+            relative = offset - self.tag_offset
+            self.fields[name] = (relative, struct.Struct(fmt), mask, args.get('start_bit', 0))
+            self.start = min(self.start, relative)
+            self.end = max(self.end, relative + struct.calcsize(fmt))
+
+    def split(self, data, block_offset, offsets):
+        """ Splits the offsets into those whose headers lie entirely
+        within the data, and those which don't """
+        inside = []
+        outside = []
+        low = block_offset - self.start
+        high = block_offset + len(data) - self.end
+        for offset in offsets:
+            if low <= offset <= high:
+                inside.append(offset)
+            else:
+                outside.append(offset)
+        return inside, outside
+
+    def values(self, name, data, block_offset, offsets):
+        """ Returns the named field for each of the pool tags at the
+        offsets, which must all have their headers within the data """
+        relative, fmt, mask, shift = self.fields[name]
+
+        if has_numpy:
+            raw = numpy.frombuffer(data, dtype = numpy.uint8)
+            positions = numpy.array(offsets, dtype = numpy.int64) - block_offset + relative
+            result = numpy.zeros(len(offsets), dtype = numpy.uint64)
+            # Native types are little endian for all pool header layouts
+            for i in range(fmt.size):
+                result |= raw[positions + i].astype(numpy.uint64) << numpy.uint64(8 * i)
+            return (result & numpy.uint64(mask)) >> numpy.uint64(shift)
+
+        unpack_from = fmt.unpack_from
+        base = relative - block_offset
+        return [ (unpack_from(data, offset + base)[0] & mask) >> shift for offset in offsets ]
+
+_pool_header_fields = {}
+
+def pool_header_fields(profile):
+    """Returns the (cached) PoolHeaderFields for a profile"""
+    fields = _pool_header_fields.get(profile, None)
+    if fields is None:
+        fields = _pool_header_fields[profile] = PoolHeaderFields(profile)
+    return fields
+
+def filter_offsets(offsets, values, condition):
+    """ Returns the offsets whose corresponding value satisfies condition
+
+    If the values are a numpy array we first try evaluating the
+    condition on the whole array at once, falling back to calling it
+    once per value for conditions which can't be vectorized.
+    """
+    if has_numpy and isinstance(values, numpy.ndarray):
+        try:
+            passed = condition(values)
+        except Exception:
+            passed = None
+        if isinstance(passed, numpy.ndarray) and passed.shape == values.shape:
+            return [ offsets[i] for i in numpy.flatnonzero(passed) ]
+        values = values.tolist()
+
+    return [ offset for offset, value in zip(offsets, values) if condition(value) ]
+
 ## The following are checks for pool scanners.
 
 class PoolTagCheck(scan.ScannerCheck):
@@ -51,6 +152,9 @@ class PoolTagCheck(scan.ScannerCheck):
         scan.ScannerCheck.__init__(self, address_space, **kwargs)
         self.tag = tag
 
+    def match_strings(self):
+        return [self.tag]
+
     def skip(self, data, offset):
         try:
             nextval = data.index(self.tag, offset + 1)
@@ -69,6 +173,21 @@ class CheckPoolSize(scan.ScannerCheck):
         scan.ScannerCheck.__init__(self, address_space, **kwargs)
         self.condition = condition
 
+    def check_block(self, data, block_offset, offsets):
+        fields = pool_header_fields(self.address_space.profile)
+        inside, outside = fields.split(data, block_offset, offsets)
+
+        pool_alignment = obj.VolMagic(self.address_space).PoolAlignment.v()
+        sizes = fields.values('BlockSize', data, block_offset, inside)
+        if has_numpy:
+            sizes = sizes * numpy.uint64(pool_alignment)
+        else:
+            sizes = [ size * pool_alignment for size in sizes ]
+
+        passed = set(filter_offsets(inside, sizes, self.condition))
+        passed.update([ offset for offset in outside if self.check(offset) ])
+        return [ offset for offset in offsets if offset in passed ]
+
     def check(self, offset):
         pool_hdr = obj.Object('_POOL_HEADER', vm = self.address_space,
                              offset = offset - 4)
@@ -79,6 +198,17 @@ class CheckPoolSize(scan.ScannerCheck):
 
         return self.condition(block_size * pool_alignment)
 
+class _PoolTypeValue(object):
+    """ Stands in for a _POOL_HEADER with the given PoolType, so that
+    the properties of the profile's _POOL_HEADER class can be evaluated
+    for a value """
+    def __init__(self, value):
+        self.value = value
+        self.PoolType = self
+
+    def v(self):
+        return self.value
+
 class CheckPoolType(scan.ScannerCheck):
     """ Check the pool type """
     def __init__(self, address_space, paged = False,
@@ -87,6 +217,51 @@ class CheckPoolType(scan.ScannerCheck):
         self.non_paged = non_paged
         self.paged = paged
         self.free = free
+        self._table = None
+
+    def type_table(self):
+        """ Returns whether each value of PoolType is one of the pool
+        types we're looking for (a list indexed by value), or None
+
+        The encoding differs between versions (from Vista the paged and
+        non-paged pools swap parity), so rather than assume one, the
+        properties of the _POOL_HEADER class the profile uses are
+        evaluated for every value the field can hold. If they can't be
+        (the class doesn't have them, or they need more than PoolType),
+        we return None and the headers are checked one at a time.
+        """
+        if self._table is None:
+            profile = self.address_space.profile
+            cls = profile.object_classes.get('_POOL_HEADER', None)
+            names = [ name for name, wanted in [('NonPagedPool', self.non_paged),
+                                                ('FreePool', self.free),
+                                                ('PagedPool', self.paged)] if wanted ]
+            relative, fmt, mask, shift = pool_header_fields(profile).fields['PoolType']
+            try:
+                getters = [ getattr(cls, name).fget for name in names ]
+                self._table = [ bool([ True for getter in getters if getter(_PoolTypeValue(value)) ])
+                                for value in range((mask >> shift) + 1) ]
+            except Exception:
+                self._table = False
+        return self._table or None
+
+    def check_block(self, data, block_offset, offsets):
+        table = self.type_table()
+        if table is None:
+            return [ offset for offset in offsets if self.check(offset) ]
+
+        fields = pool_header_fields(self.address_space.profile)
+        inside, outside = fields.split(data, block_offset, offsets)
+
+        types = fields.values('PoolType', data, block_offset, inside)
+        if has_numpy:
+            condition = numpy.array(table, dtype = bool)[types.astype(numpy.intp)]
+            passed = set([ inside[i] for i in numpy.flatnonzero(condition) ])
+        else:
+            passed = set([ offset for offset, value in zip(inside, types) if table[value] ])
+
+        passed.update([ offset for offset in outside if self.check(offset) ])
+        return [ offset for offset in offsets if offset in passed ]
 
     def check(self, offset):
         pool_hdr = obj.Object('_POOL_HEADER', vm = self.address_space,
@@ -102,6 +277,15 @@ class CheckPoolIndex(scan.ScannerCheck):
         scan.ScannerCheck.__init__(self, address_space, **kwargs)
         self.value = value
 
+    def check_block(self, data, block_offset, offsets):
+        fields = pool_header_fields(self.address_space.profile)
+        inside, outside = fields.split(data, block_offset, offsets)
+
+        indexes = fields.values('PoolIndex', data, block_offset, inside)
+        passed = set(filter_offsets(inside, indexes, lambda x: x == self.value))
+        passed.update([ offset for offset in outside if self.check(offset) ])
+        return [ offset for offset in offsets if offset in passed ]
+
     def check(self, offset):
         pool_hdr = obj.Object('_POOL_HEADER', vm = self.address_space,
                              offset = offset - 4)
@@ -48,7 +48,8 @@ class DLLDump(procdump.ProcExeDump):
                           help = 'Dump DLLS at the specified BASE offset in the process address space',
                           action = 'store', type = 'int')
 
-    @cache.CacheDecorator(lambda self: "tests/dlldump/regex={0}/ignore_case={1}/offset={2}/base={3}".format(self._config.REGEX, self._config.IGNORE_CASE, self._config.OFFSET, self._config.BASE))
+    @cache.CacheDecorator(lambda self: "tests/dlldump/regex={0}/ignore_case={1}/offset={2}/base={3}".format(self._config.REGEX, self._config.IGNORE_CASE, self._config.OFFSET, self._config.BASE),
+                          depends = ['pid'])
     def calculate(self):
         addr_space = utils.load_as(self._config)
 
@@ -19,6 +19,8 @@
 # along with Volatility.  If not, see <http://www.gnu.org/licenses/>.
 #
 
+import os
+import multiprocessing
 import volatility.utils as utils
 import volatility.obj as obj
 import volatility.plugins.common as common
@@ -29,6 +31,13 @@ import volatility.win32.tasks as tasks
 class HibInfo(common.AbstractWindowsCommand):
     """Dump hibernation file information"""
 
+    def __init__(self, config, *args, **kwargs):
+        common.AbstractWindowsCommand.__init__(self, config, *args, **kwargs)
+        config.add_option("CONVERT", default = None, type = 'str',
+                          help = "Converts the hibernation file to a raw image written to CONVERT")
+        config.add_option("WORKERS", default = multiprocessing.cpu_count(), type = 'int',
+                          help = "Number of processes used to decompress blocks when converting")
+
     @cache.CacheDecorator("tests/hibinfo")
     def calculate(self):
         """Determines the address space"""
@@ -80,3 +89,24 @@ class HibInfo(common.AbstractWindowsCommand):
         outfd.write(" CR4[PAE]: {0}\n".format((sr.Cr4 >> 5) & 1))
 
         outfd.write("\nWindows Version is {0}.{1} ({2})\n\n".format(peb.OSMajorVersion, peb.OSMinorVersion, peb.OSBuildNumber))
+
+        if self._config.CONVERT:
+            self.convert(outfd, data['adrs'], self._config.CONVERT)
+
+    def convert(self, outfd, adrs, filename):
+        """Writes the decompressed pages out as a raw image"""
+        if os.path.exists(filename) and (os.path.getsize(filename) > 1):
+            debug.error("Refusing to overwrite an existing file, please remove it before continuing")
+
+        outfd.write("Converting to raw image {0} using {1} workers: |".format(filename, self._config.WORKERS))
+        f = file(filename, "wb+")
+        try:
+            for count, (page, data) in enumerate(adrs.decompress_pages(self._config.WORKERS)):
+                f.seek(page * 0x1000)
+                f.write(data)
+                if count % 0x1000 == 0:
+                    outfd.write(".")
+                    outfd.flush()
+        finally:
+            f.close()
+        outfd.write("|\n")
@@ -49,6 +49,9 @@ class MultiStringFinderCheck(scan.ScannerCheck):
                 return True
         return False
 
+    def match_strings(self):
+        return self.needles
+
     def skip(self, data, offset):
         nextval = len(data)
         for needle in self.needles:
@@ -59,6 +62,10 @@ class MultiStringFinderCheck(scan.ScannerCheck):
 
 class MultiPrefixFinderCheck(MultiStringFinderCheck):
     """ Checks for multiple strings per page, finishing at the offset """
+
+    # The needles end at the offset rather than starting there
+    match_strings = None
+
     def check(self, offset):
         verify = self.address_space.read(offset - self.maxlen, self.maxlen)
         for match in self.needles:
@@ -81,15 +88,17 @@ class KDBGScanner(scan.BaseScanner):
                         ("MultiStringFinderCheck", {'needles':oses})]
         scan.BaseScanner.__init__(self, window_size)
 
+    def object_offset(self, found, address_space):
+        # Compensate for KDBG appearing within the searched for structure
+        # (0x10 should really be the offset of OwnerTag from with the structure,
+        #  however we don't know which profile to read it from, so it's hardwired)
+        # NOTE: this will not work correctly for _KDDEBUGGER_DATA32 structures
+        #       however they're only necessary for NT or older
+        return found - 0x10
+
     def scan(self, address_space, offset = 0, maxlen = None):
         for offset in scan.BaseScanner.scan(self, address_space, offset, maxlen):
-            # Compensate for KDBG appearing within the searched for structure
-            # (0x10 should really be the offset of OwnerTag from with the structure,
-            #  however we don't know which profile to read it from, so it's hardwired)
-            # NOTE: this will not work correctly for _KDDEBUGGER_DATA32 structures
-            #       however they're only necessary for NT or older
-            offset = offset - 0x10
-            yield offset
+            yield self.object_offset(offset, address_space)
 
 class KDBGScan(common.AbstractWindowsCommand):
     """Search for and dump potential KDBG values"""
@@ -655,7 +655,7 @@ class ApiHooks(procdump.ProcExeDump):
         p = p.dereference_as("_SOCK_PROC_TABLE")
 
         # Enumerate functions in the procedure table 
-        for i, function_address in enumerate(p.Functions):
+        for i, function_address in enumerate(p.Functions.values()):
 
             function_owner = module_group.find_module(function_address)
 
@@ -315,9 +315,9 @@ class ImpScan(common.AbstractWindowsCommand):
                 size_to_read = self._config.SIZE
 
                 if not size_to_read:
-                    for vad in task.VadRoot.traverse():
-                        if base_address >= vad.Start and base_address <= vad.End:
-                            size_to_read = vad.Length
+                    vad = task.vad_lookup(base_address)
+                    if vad:
+                        size_to_read = vad.Length
                     if not size_to_read:
                         debug.error("You must specify --SIZE")
             else:
@@ -0,0 +1,127 @@
+# Volatility
+# Copyright (C) 2007-2013 Volatility Foundation
+#
+# This file is part of Volatility.
+#
+# Volatility is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# Volatility is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Volatility.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""
+@license:      GNU General Public License 2.0
+@organization: Volatility Foundation
+"""
+
+#pylint: disable-msg=C0111
+
+import volatility.scan as scan
+import volatility.utils as utils
+import volatility.debug as debug
+import volatility.plugins.common as common
+import volatility.plugins.filescan as filescan
+import volatility.plugins.modscan as modscan
+import volatility.plugins.connscan as connscan
+import volatility.plugins.sockscan as sockscan
+import volatility.plugins.netscan as netscan
+import volatility.plugins.registry.hivescan as hivescan
+import volatility.plugins.gui.windowstations as windowstations
+import volatility.plugins.gui.atoms as atoms
+import volatility.plugins.malware.callbacks as callbacks
+
+## The scanners that multiscan knows about. Each entry is the name of
+## the scanner, the command whose is_valid_profile decides whether the
+## scanner applies to the selected profile, and a callable returning
+## a fresh scanner instance given the physical address space.
+SCANNERS = [
+    ('psscan', filescan.PSScan, lambda space: filescan.PoolScanProcess()),
+    ('filescan', filescan.FileScan, lambda space: filescan.PoolScanFile()),
+    ('driverscan', filescan.DriverScan, lambda space: filescan.PoolScanDriver()),
+    ('symlinkscan', filescan.SymLinkScan, lambda space: filescan.PoolScanSymlink()),
+    ('mutantscan', filescan.MutantScan, lambda space: filescan.PoolScanMutant()),
+    ('modscan', modscan.ModScan, lambda space: modscan.PoolScanModuleFast()),
+    ('thrdscan', modscan.ThrdScan, lambda space: modscan.PoolScanThreadFast()),
+    ('connscan', connscan.ConnScan, lambda space: connscan.PoolScanConnFast()),
+    ('sockscan', sockscan.SockScan, lambda space: sockscan.PoolScanSockFast()),
+    ('tcpl', netscan.Netscan, lambda space: netscan.PoolScanTcpListener()),
+    ('tcpe', netscan.Netscan, lambda space: netscan.PoolScanTcpEndpoint()),
+    ('udpa', netscan.Netscan, lambda space: netscan.PoolScanUdpEndpoint()),
+    ('hivescan', hivescan.HiveScan,
+        lambda space: hivescan.PoolScanHiveFast2(space.profile.get_obj_size('_CMHIVE'))),
+    ('wndscan', windowstations.WndScan, lambda space: windowstations.PoolScanWind()),
+    ('atomscan', atoms.AtomScan, lambda space: atoms.PoolScanAtom()),
+    ('fscallback', callbacks.Callbacks, lambda space: callbacks.PoolScanFSCallback()),
+    ('shutdowncallback', callbacks.Callbacks, lambda space: callbacks.PoolScanShutdownCallback()),
+    ('genericcallback', callbacks.Callbacks, lambda space: callbacks.PoolScanGenericCallback()),
+    ('dbgprintcallback', callbacks.Callbacks, lambda space: callbacks.PoolScanDbgPrintCallback()),
+    ('registrycallback', callbacks.Callbacks, lambda space: callbacks.PoolScanRegistryCallback()),
+    ('pnp9', callbacks.Callbacks, lambda space: callbacks.PoolScanPnp9()),
+    ('pnpd', callbacks.Callbacks, lambda space: callbacks.PoolScanPnpD()),
+    ('pnpc', callbacks.Callbacks, lambda space: callbacks.PoolScanPnpC()),
+    ]
+
+class MultiScan(common.AbstractWindowsCommand):
+    """Run several pool scanners in a single pass over physical memory
+
+    Each block of physical memory is read once and checked by every
+    selected scanner, so running psscan, filescan, modscan, etc together
+    only costs one pass over the image. The offsets reported are the
+    same as those reported by the individual scanning plugins.
+    """
+
+    def __init__(self, config, *args, **kwargs):
+        common.AbstractWindowsCommand.__init__(self, config, *args, **kwargs)
+        config.add_option('SCANNERS', default = None, type = 'str',
+                          help = 'Scanners to run (comma-separated), defaults to all ' \
+                                 'those valid for the profile: ' + \
+                                 ", ".join([ name for name, _, _ in SCANNERS ]))
+
+    def get_scanners(self, space):
+        """Returns a dict of name -> scanner for the requested scanners"""
+        if self._config.SCANNERS:
+            wanted = [ s.strip().lower() for s in self._config.SCANNERS.split(',') ]
+        else:
+            wanted = None
+
+        known = [ name for name, _, _ in SCANNERS ]
+        for name in wanted or []:
+            if name not in known:
+                debug.error("Unknown scanner {0}, choose from {1}".format(name, ", ".join(known)))
+
+        scanners = {}
+        for name, command, factory in SCANNERS:
+            if wanted is not None and name not in wanted:
+                continue
+            if not command.is_valid_profile(space.profile):
+                if wanted is not None:
+                    debug.warning("Scanner {0} does not support the selected profile".format(name))
+                continue
+            scanners[name] = factory(space)
+
+        return scanners
+
+    def calculate(self):
+        address_space = utils.load_as(self._config, astype = 'physical')
+
+        scanners = self.get_scanners(address_space)
+        if not scanners:
+            debug.error("No scanners to run for the selected profile")
+
+        return scan.MultiScanner(scanners).scan(address_space)
+
+    def render_text(self, outfd, data):
+        self.table_header(outfd, [('Scanner', '12'),
+                                  ('Offset(P)', '[addrpad]'),
+                                  ])
+
+        for name, offset in data:
+            self.table_row(outfd, name, offset)
@@ -210,13 +210,15 @@ def LinuxProfileFactory(profpkg):
             self.sys_map = {}
             obj.Profile.clear(self)
 
-        def reset(self):
-            """Reset the vtypes, sysmap and apply modifications, then compile"""
-            self.clear()
+        def build(self):
+            """Load the vtypes and sysmap, then apply modifications"""
             self.load_vtypes()
             self.load_sysmap()
             self.load_modifications()
-            self.compile()
+
+        def cache_dependencies(self):
+            """The profile is also built from its zip file"""
+            return obj.Profile.cache_dependencies(self) + [profpkg.filename]
 
         def _merge_anonymous_members(self, vtypesvar):
             members_index = 1
@@ -486,38 +488,36 @@ class hlist_node(obj.CType):
 
 class list_head(obj.CType):
     """A list_head makes a doubly linked list."""
-    def list_of_type(self, obj_type, member, offset = -1, forward = True, head_sentinel = True):
+    def list_addresses(self, forward = True, head_sentinel = True):
+        """Returns the addresses of the list_heads in the list (see obj.walk_list)"""
         if not self.is_valid():
-            return
+            return []
 
-        ## Get the first element
-        if forward:
-            nxt = self.next.dereference()
-        else:
-            nxt = self.prev.dereference()
+        link = "next" if forward else "prev"
 
-        offset = self.obj_vm.profile.get_obj_offset(obj_type, member)
+        ## Get the first element
+        first = self.m(link).v()
+        if first == None:
+            return []
 
-        seen = set()
+        seen = []
         if head_sentinel:
             # We're a header element and not to be included in the list
-            seen.add(self.obj_offset)
+            seen.append(self.obj_offset)
 
-        while nxt.is_valid() and nxt.obj_offset not in seen:
-            ## Instantiate the object
-            item = obj.Object(obj_type, offset = nxt.obj_offset - offset,
-                                    vm = self.obj_vm,
-                                    parent = self.obj_parent,
-                                    name = obj_type)
+        return obj.walk_list(self.obj_vm, first,
+                             self.obj_vm.profile.get_obj_offset("list_head", link),
+                             native_vm = self.obj_native_vm, seen = seen)
 
-            seen.add(nxt.obj_offset)
-
-            yield item
+    def list_of_type(self, obj_type, member, offset = -1, forward = True, head_sentinel = True):
+        offset = self.obj_vm.profile.get_obj_offset(obj_type, member)
 
-            if forward:
-                nxt = item.m(member).next.dereference()
-            else:
-                nxt = item.m(member).prev.dereference()
+        for address in self.list_addresses(forward, head_sentinel):
+            ## Instantiate the object
+            yield obj.Object(obj_type, offset = address - offset,
+                                   vm = self.obj_vm,
+                                   parent = self.obj_parent,
+                                   name = obj_type)
 
     def __nonzero__(self):
         ## List entries are valid when both Flinks and Blink are valid
@@ -755,8 +755,11 @@ class task_struct(obj.CType):
         directory_table_base = self.obj_vm.vtop(self.mm.pgd.v())
 
         try:
-            process_as = self.obj_vm.__class__(
-                self.obj_vm.base, self.obj_vm.get_config(), dtb = directory_table_base)
+            if hasattr(self.obj_vm, "get_process_space"):
+                process_as = self.obj_vm.get_process_space(directory_table_base)
+            else:
+                process_as = self.obj_vm.__class__(
+                    self.obj_vm.base, self.obj_vm.get_config(), dtb = directory_table_base)
 
         except AssertionError, _e:
             return obj.NoneObject("Unable to get process AS")
@@ -791,13 +791,15 @@ def MacProfileFactory(profpkg):
             self.sys_map = {}
             obj.Profile.clear(self)
 
-        def reset(self):
-            """Reset the vtypes, sysmap and apply modifications, then compile"""
-            self.clear()
+        def build(self):
+            """Load the vtypes and sysmap, then apply modifications"""
             self.load_vtypes()
             self.load_sysmap()
             self.load_modifications()
-            self.compile()
+
+        def cache_dependencies(self):
+            """The profile is also built from its zip file"""
+            return obj.Profile.cache_dependencies(self) + [profpkg.filename]
 
         def load_vtypes(self):
             """Loads up the vtypes data"""
@@ -73,6 +73,8 @@ class WinSyscallsAttribute(obj.ProfileModification):
 class AbstractSyscalls(obj.ProfileModification):
     syscall_module = 'No default'
     def modification(self, profile):
+        # The syscall modules are only imported when they're needed
+        __import__(self.syscall_module)
         module = sys.modules.get(self.syscall_module, None)
         profile.additional['syscalls'] = module.syscalls
 
@@ -32,7 +32,7 @@ import volatility.debug as debug #pylint: disable-msg=W0611
 import volatility.obj as obj
 
 class _MM_AVL_TABLE(obj.CType):
-    def traverse(self):
+    def traverse(self, **kwargs):
         """
         This is a hack to get around the fact that _MM_AVL_TABLE.BalancedRoot (an _MMADDRESS_NODE) doesn't
         work the same way as the other _MMADDRESS_NODEs. In particular, we want _MMADDRESS_NODE to behave
@@ -56,7 +56,7 @@ class _MM_AVL_TABLE(obj.CType):
 
         node = obj.Object('_MMADDRESS_NODE', vm = self.obj_vm, offset = rc.v(), parent = self.obj_parent)
 
-        for c in node.traverse():
+        for c in node.traverse(**kwargs):
             yield c
 
 class _MMVAD_SHORT(windows._MMVAD_SHORT):
@@ -19,6 +19,7 @@
 #
 
 import datetime, struct
+from bisect import bisect_right
 import volatility.plugins.overlays.basic as basic
 import volatility.plugins.kpcrscan as kpcr
 import volatility.plugins.kdbgscan as kdbg
@@ -208,39 +209,37 @@ class _UNICODE_STRING(obj.CType):
 
 class _LIST_ENTRY(obj.CType):
     """ Adds iterators for _LIST_ENTRY types """
-    def list_of_type(self, type, member, forward = True, head_sentinel = True):
+    def list_addresses(self, forward = True, head_sentinel = True):
+        """Returns the addresses of the _LIST_ENTRYs in the list (see obj.walk_list)"""
         if not self.is_valid():
-            return
+            return []
 
-        ## Get the first element
-        if forward:
-            nxt = self.Flink.dereference()
-        else:
-            nxt = self.Blink.dereference()
+        link = "Flink" if forward else "Blink"
 
-        offset = self.obj_vm.profile.get_obj_offset(type, member)
+        ## Get the first element
+        first = self.m(link).v()
+        if first == None:
+            return []
 
-        seen = set()
+        seen = []
         if head_sentinel:
             # We're a header element and not to be included in the list
-            seen.add(self.obj_offset)
+            seen.append(self.obj_offset)
 
-        while nxt.is_valid() and nxt.obj_offset not in seen:
-            ## Instantiate the object
-            item = obj.Object(type, offset = nxt.obj_offset - offset,
-                                    vm = self.obj_vm,
-                                    parent = self.obj_parent,
-                                    native_vm = self.obj_native_vm,
-                                    name = type)
-
-            seen.add(nxt.obj_offset)
+        return obj.walk_list(self.obj_vm, first,
+                             self.obj_vm.profile.get_obj_offset("_LIST_ENTRY", link),
+                             native_vm = self.obj_native_vm, seen = seen)
 
-            yield item
+    def list_of_type(self, type, member, forward = True, head_sentinel = True):
+        offset = self.obj_vm.profile.get_obj_offset(type, member)
 
-            if forward:
-                nxt = item.m(member).Flink.dereference()
-            else:
-                nxt = item.m(member).Blink.dereference()
+        for address in self.list_addresses(forward, head_sentinel):
+            ## Instantiate the object
+            yield obj.Object(type, offset = address - offset,
+                                   vm = self.obj_vm,
+                                   parent = self.obj_parent,
+                                   native_vm = self.obj_native_vm,
+                                   name = type)
 
     def __nonzero__(self):
         ## List entries are valid when both Flinks and Blink are valid
@@ -333,7 +332,10 @@ class _EPROCESS(obj.CType):
         directory_table_base = self.Pcb.DirectoryTableBase.v()
 
         try:
-            process_as = self.obj_vm.__class__(self.obj_vm.base, self.obj_vm.get_config(), dtb = directory_table_base)
+            if hasattr(self.obj_vm, "get_process_space"):
+                process_as = self.obj_vm.get_process_space(directory_table_base)
+            else:
+                process_as = self.obj_vm.__class__(self.obj_vm.base, self.obj_vm.get_config(), dtb = directory_table_base)
         except AssertionError, _e:
             return obj.NoneObject("Unable to get process AS")
 
@@ -370,6 +372,25 @@ class _EPROCESS(obj.CType):
 
         return obj.NoneObject("Cannot get process Token")
 
+    def vad_lookup(self, address):
+        """Returns the VAD containing address (or None if there isn't one)
+
+        The valid VADs are indexed by their start addresses the first
+        time this is called, so each lookup is a binary search.
+        """
+        try:
+            starts, vads = self._vad_index
+        except AttributeError:
+            vads = [ vad for vad in self.VadRoot.traverse() if vad.is_valid() ]
+            vads.sort(key = lambda vad: vad.Start)
+            starts = [ vad.Start for vad in vads ]
+            self.newattr('_vad_index', (starts, vads))
+
+        pos = bisect_right(starts, address) - 1
+        if pos >= 0 and address <= vads[pos].End:
+            return vads[pos]
+        return None
+
 class _TOKEN(obj.CType):
     """A class for Tokens"""
 
@@ -383,10 +404,10 @@ class _TOKEN(obj.CType):
         if self.UserAndGroupCount < 0xFFFF:
             for sa in self.UserAndGroups.dereference():
                 sid = sa.Sid.dereference_as('_SID')
-                for i in sid.IdentifierAuthority.Value:
+                for i in sid.IdentifierAuthority.Value.values():
                     id_auth = i
                 yield "S-" + "-".join(str(i) for i in (sid.Revision, id_auth) +
-                                      tuple(sid.SubAuthority))
+                                      tuple(sid.SubAuthority.values()))
 
     def privileges(self):
         """Generator for privileges.
@@ -454,42 +475,47 @@ class _HANDLE_TABLE(obj.CType):
         table = obj.Object("Array", offset = offset, vm = self.obj_vm, count = count,
                            targetType = targetType, parent = self, native_vm = self.obj_native_vm)
 
-        if table:
+        if table and level > 0:
+            ## The upper levels are just tables of pointers, so read
+            ## them in one go
+            for entry in table.values():
+                if entry == None:
+                    break
+
+                ## We need to go deeper:
+                for h in self._make_handle_array(entry, level - 1, depth):
+                    yield h
+                depth += 1
+
+        elif table:
             for entry in table:
                 if not entry.is_valid():
                     break
 
-                if level > 0:
-                    ## We need to go deeper:
-                    for h in self._make_handle_array(entry, level - 1, depth):
-                        yield h
-                    depth += 1
-                else:
-
-                    # All handle values are multiples of four, on both x86 and x64. 
-                    handle_multiplier = 4
-                    # Calculate the starting handle value for this level. 
-                    handle_level_base = depth * count * handle_multiplier
-                    # The size of a handle table entry.
-                    handle_entry_size = self.obj_vm.profile.get_obj_size("_HANDLE_TABLE_ENTRY")
-                    # Finally, compute the handle value for this object. 
-                    handle_value = ((entry.obj_offset - offset) /
-                                   (handle_entry_size / handle_multiplier)) + handle_level_base
-
-                    ## OK We got to the bottom table, we just resolve
-                    ## objects here:
-                    item = self.get_item(entry, handle_value)
-
-                    if item == None:
-                        continue
-
-                    try:
-                        # New object header
-                        if item.TypeIndex != 0x0:
-                            yield item
-                    except AttributeError:
-                        if item.Type.Name:
-                            yield item
+                # All handle values are multiples of four, on both x86 and x64. 
+                handle_multiplier = 4
+                # Calculate the starting handle value for this level. 
+                handle_level_base = depth * count * handle_multiplier
+                # The size of a handle table entry.
+                handle_entry_size = self.obj_vm.profile.get_obj_size("_HANDLE_TABLE_ENTRY")
+                # Finally, compute the handle value for this object. 
+                handle_value = ((entry.obj_offset - offset) /
+                               (handle_entry_size / handle_multiplier)) + handle_level_base
+
+                ## OK We got to the bottom table, we just resolve
+                ## objects here:
+                item = self.get_item(entry, handle_value)
+
+                if item == None:
+                    continue
+
+                try:
+                    # New object header
+                    if item.TypeIndex != 0x0:
+                        yield item
+                except AttributeError:
+                    if item.Type.Name:
+                        yield item
 
     def handles(self):
         """ A generator which yields this process's handles
@@ -651,28 +677,47 @@ class _MMVAD_SHORT(obj.CType):
                 self.Start < obj.VolMagic(self.obj_vm).MaxAddress.v() and
                 self.End < (obj.VolMagic(self.obj_vm).MaxAddress.v() << 12))
 
-    def traverse(self, visited = None):
-        """ Traverse the VAD tree by generating all the left items,
-        then the right items.
+    def traverse(self, visited = None, order = 'in'):
+        """ Traverse the VAD tree in order, generating the VADs sorted
+        by their start addresses. With order = 'pre', each node is
+        generated before its children instead (the left subtree before
+        the right one), which is the order to draw the tree in.
 
-        We try to be tolerant of cycles by storing all offsets visited.
+        The tree is walked with a stack rather than by recursion, so
+        each node is read once however deep the tree is. We try to be
+        tolerant of cycles by storing all offsets visited, and never
+        descending into a node twice.
         """
         if visited == None:
             visited = set()
 
-        ## We try to prevent loops here
-        if self.obj_offset in visited:
+        if order == 'pre':
+            stack = [self]
+            while stack:
+                node = stack.pop()
+                if isinstance(node, obj.NoneObject) or node.obj_offset in visited:
+                    continue
+                visited.add(node.obj_offset)
+                yield node
+                stack.append(node.RightChild.dereference())
+                stack.append(node.LeftChild.dereference())
             return
 
-        yield self
-
-        for c in self.LeftChild.traverse(visited = visited):
-            visited.add(c.obj_offset)
-            yield c
-
-        for c in self.RightChild.traverse(visited = visited):
-            visited.add(c.obj_offset)
-            yield c
+        stack = []
+        node = self
+        while True:
+            ## Go down the left branch as far as we can
+            while not isinstance(node, obj.NoneObject) and node.obj_offset not in visited:
+                visited.add(node.obj_offset)
+                stack.append(node)
+                node = node.LeftChild.dereference()
+
+            if not stack:
+                return
+
+            node = stack.pop()
+            yield node
+            node = node.RightChild.dereference()
 
     @property
     def Parent(self):
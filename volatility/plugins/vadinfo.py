@@ -170,14 +170,14 @@ class VADTree(VADInfo):
         for task in data:
             outfd.write("*" * 72 + "\n")
             outfd.write("Pid: {0:6}\n".format(task.UniqueProcessId))
-            levels = {}
             self.table_header(None,
                               [("indent", ""),
                                ("Start", "[addrpad]"),
                                ("-", "1"),
                                ("End", "[addrpad]")
                               ])
-            for vad in task.VadRoot.traverse():
+            levels = {}
+            for vad in task.VadRoot.traverse(order = 'pre'):
                 if vad:
                     level = levels.get(vad.Parent.obj_offset, -1) + 1
                     levels[vad.obj_offset] = level
@@ -193,7 +193,7 @@ class VADTree(VADInfo):
             outfd.write("/* Pid: {0:6} */\n".format(task.UniqueProcessId))
             outfd.write("digraph processtree {\n")
             outfd.write("graph [rankdir = \"TB\"];\n")
-            for vad in task.VadRoot.traverse():
+            for vad in task.VadRoot.traverse(order = 'pre'):
                 if vad:
                     if vad.Parent:
                         outfd.write("vad_{0:08x} -> vad_{1:08x}\n".format(vad.Parent.obj_offset or 0, vad.obj_offset))
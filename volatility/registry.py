@@ -43,20 +43,45 @@ functionality. For example we may include a Scanner, Report and File
 classes in the same plugin and have them all automatically loaded.
 """
 
-import os, zipfile
+import os, sys, zipfile, hashlib
+import cPickle as pickle
+import volatility.conf as conf
 import volatility.debug as debug
 import volatility.plugins as plugins
 
+## The PluginImporter which imports plugin modules on demand (if it was lazy)
+LAZY_IMPORTER = None
+
 class PluginImporter(object):
     """This class searches through a comma-separated list of plugins and
        imports all classes found, based on their path and a fixed prefix.
+
+       If lazy is set, only the modules needed to start up (those
+       defining address spaces, profiles or config options) are imported,
+       using a PluginIndex of the classes each module defines, and the
+       rest are imported on demand (see import_subclasses).
     """
-    def __init__(self):
+
+    ## Modules whose names end with these hold large amounts of data
+    ## (e.g. the vtypes for a single profile). They are imported after
+    ## all the other modules, and only if no class names them in one of
+    ## the lazy_attributes, since those are imported on demand by
+    ## whatever needs them (e.g. when the profile is instantiated).
+    data_suffixes = ("_vtypes", "_syscalls")
+    lazy_attributes = ("_md_vtype_module", "syscall_module")
+
+    ## Modules defining subclasses of these are always imported, since
+    ## they're needed before we know which plugin will run
+    startup_classes = ("BaseAddressSpace", "Profile")
+
+    def __init__(self, lazy = False):
         """Gathers all the plugins from config.PLUGINS
            Determines their namespaces and maintains a dictionary of modules to filepaths
            Then imports all modules found
         """
+        global LAZY_IMPORTER
         self.modnames = {}
+        self.options = {}
 
         # Handle additional plugins
         for path in plugins.__path__:
@@ -75,7 +100,25 @@ class PluginImporter(object):
                     else:
                         self.modnames[namespace] = filepath
 
-        self.run_imports()
+        self.index = None
+        if lazy:
+            self.index = PluginIndex.load()
+            if self.index and self.index.failed:
+                # Retry modules which failed to import when the index was
+                # built, in case their dependencies have been installed
+                for i in self.index.failed:
+                    self.import_module(i)
+                if [ i for i in self.index.failed if i in sys.modules ]:
+                    self.index = None
+
+        if self.index:
+            LAZY_IMPORTER = self
+            for i in self.index.startup_modules(self.startup_classes):
+                self.import_module(i)
+        else:
+            self.run_imports()
+            if lazy:
+                PluginIndex.build(self.modnames.keys(), self.options).save()
 
     def walkzip(self, path):
         """Walks a path independent of whether it includes a zipfile or not"""
@@ -112,14 +155,216 @@ class PluginImporter(object):
 
     def run_imports(self):
         """Imports all the already found modules"""
+        deferred = []
         for i in self.modnames.keys():
             if self.modnames[i] is not None:
-                try:
-                    __import__(i)
-                except Exception, e:
-                    print "*** Failed to import " + i + " (" + str(e.__class__.__name__) + ": " + str(e) + ")"
-                    # This is too early to have had the debug filter lowered to include debugging messages
-                    debug.post_mortem(2)
+                if i.endswith(self.data_suffixes):
+                    deferred.append(i)
+                else:
+                    self.import_module(i)
+
+        lazy = self.lazy_modules()
+        for i in deferred:
+            if i not in lazy:
+                self.import_module(i)
+
+    def import_module(self, name):
+        before = len(conf.ConfObject.options)
+        try:
+            __import__(name)
+        except Exception, e:
+            print "*** Failed to import " + name + " (" + str(e.__class__.__name__) + ": " + str(e) + ")"
+            # This is too early to have had the debug filter lowered to include debugging messages
+            debug.post_mortem(2)
+        # Keep track of which modules add options when they're imported
+        if len(conf.ConfObject.options) > before:
+            self.options[name] = True
+
+    def import_subclasses(self, cls):
+        """Imports the modules which define subclasses of cls"""
+        for i in self.index.subclass_modules(cls.__name__):
+            if i not in sys.modules:
+                self.import_module(i)
+
+    def import_class(self, name, lower = False):
+        """Imports the modules which define a class with this name"""
+        for i in self.index.class_modules(name, lower):
+            if i not in sys.modules:
+                self.import_module(i)
+
+    def lazy_modules(self):
+        """Returns the names of modules that classes will import on demand"""
+        result = set()
+        for name in self.modnames.keys():
+            module = sys.modules.get(name, None)
+            if module is None:
+                continue
+            for value in vars(module).values():
+                if isinstance(value, type):
+                    for attr in self.lazy_attributes:
+                        result.add(getattr(value, attr, None))
+        return result
+
+def plugin_files():
+    """Returns the names of the files in the plugin directories, or None
+       if they're not all directories (e.g. the plugins are in a zipfile)"""
+    result = []
+    for path in plugins.__path__:
+        path = os.path.abspath(path)
+        if not os.path.isdir(path):
+            return None
+        for dirpath, _dirnames, filenames in os.walk(path):
+            for filename in filenames:
+                base, ext = os.path.splitext(filename)
+                # Compiled files change on every fresh install or run, so only
+                # count them if there's no source
+                if ext in [".pyc", ".pyo"] and base + ".py" in filenames:
+                    continue
+                result.append(os.path.join(dirpath, filename))
+    return sorted(result)
+
+_signature = None
+
+def plugin_signature():
+    """Returns a hash of the names, sizes and modification times of the
+       files in the plugin directories (or None, see plugin_files)"""
+    global _signature
+    if _signature is None:
+        files = plugin_files()
+        if files is None:
+            return None
+        h = hashlib.md5()
+        for filename in files:
+            st = os.stat(filename)
+            h.update("{0}:{1}:{2}\n".format(filename, st.st_mtime, st.st_size))
+        _signature = h.hexdigest()
+    return _signature
+
+class PluginIndex(object):
+    """An index of the classes which each plugin module defines
+
+       This lets the PluginImporter import only the plugin modules that
+       are needed. It is built by importing all of the plugins (on the
+       first run, and again whenever a file in the plugin directories
+       changes) and stored in the cache directory.
+    """
+    version = 1
+
+    def __init__(self, signature, modules, failed):
+        self.signature = signature
+        ## Maps module names to the classes they define, and whether they
+        ## add config options when imported. Each class is listed with
+        ## the names of all its base classes.
+        self.modules = modules
+        ## Modules which failed to import
+        self.failed = failed
+
+    @staticmethod
+    def filename():
+        """Returns the index file for the current plugin directories"""
+        # Imported here since the cache imports the object model, and with
+        # it this module
+        import volatility.cache as cache
+        if not cache.config.CACHE_DIRECTORY:
+            return None
+        key = hashlib.md5(os.pathsep.join(plugins.__path__)).hexdigest()
+        return os.path.join(cache.config.CACHE_DIRECTORY, "plugins-{0}.idx".format(key))
+
+    @classmethod
+    def load(cls):
+        """Returns the stored index, or None if it's missing or out of date"""
+        filename = cls.filename()
+        signature = plugin_signature()
+        if not filename or not signature or not os.path.exists(filename):
+            return None
+        try:
+            fd = open(filename, 'rb')
+            try:
+                data = pickle.load(fd)
+            finally:
+                fd.close()
+        except Exception, e:
+            debug.debug("Unable to load plugin index {0}: {1}".format(filename, e))
+            return None
+        if data.get('version') != cls.version or data.get('signature') != signature:
+            return None
+        return cls(signature, data['modules'], data['failed'])
+
+    @classmethod
+    def build(cls, modnames, options):
+        """Builds the index from the (imported) modules"""
+        modules = {}
+        failed = []
+        for name in modnames:
+            if name in sys.modules and sys.modules[name]:
+                modules[name] = {'classes': {}, 'options': options.get(name, False)}
+            else:
+                failed.append(name)
+
+        # Walk every class, since some are created dynamically (e.g. by
+        # the linux profile factory) rather than bound to a module global
+        todo = [object]
+        while todo:
+            c = todo.pop()
+            todo.extend(type.__subclasses__(c))
+            module = modules.get(c.__module__, None)
+            if module is None:
+                continue
+            module['classes'][c.__name__] = [ b.__name__ for b in c.__mro__ ]
+            if 'register_options' in c.__dict__:
+                module['options'] = True
+
+        return cls(plugin_signature(), modules, failed)
+
+    def save(self):
+        filename = self.filename()
+        if not filename or not self.signature:
+            return
+        data = {'version': self.version, 'signature': self.signature,
+                'modules': self.modules, 'failed': self.failed}
+        try:
+            directory = os.path.dirname(filename)
+            if not os.path.isdir(directory):
+                os.makedirs(directory)
+            tmpname = "{0}.{1}".format(filename, os.getpid())
+            fd = open(tmpname, 'wb')
+            try:
+                pickle.dump(data, fd, 2)
+            finally:
+                fd.close()
+            os.rename(tmpname, filename)
+        except EnvironmentError, e:
+            debug.debug("Unable to save plugin index {0}: {1}".format(filename, e))
+
+    def startup_modules(self, classes):
+        """Returns the modules which add options, or define subclasses of any of classes"""
+        result = []
+        for name, module in sorted(self.modules.items()):
+            if module['options'] or [ c for c, bases in module['classes'].items()
+                                      if set(bases).intersection(classes) ]:
+                result.append(name)
+        return result
+
+    def subclass_modules(self, name):
+        """Returns the modules which define subclasses of the named class"""
+        return [ m for m, module in sorted(self.modules.items())
+                 if [ c for c, bases in module['classes'].items() if name in bases ] ]
+
+    def class_modules(self, name, lower = False):
+        """Returns the modules which define a class with this name"""
+        result = []
+        for m, module in sorted(self.modules.items()):
+            for c in module['classes']:
+                if (c.lower() if lower else c) == name:
+                    result.append(m)
+                    break
+        return result
+
+def import_subclasses(cls):
+    """Imports the plugin modules which define subclasses of cls, if
+       plugins are being imported on demand"""
+    if LAZY_IMPORTER:
+        LAZY_IMPORTER.import_subclasses(cls)
 
 def _get_subclasses(cls):
     """ Run through subclasses of a particular class
@@ -136,6 +381,20 @@ def _get_subclasses(cls):
 
 def get_plugin_classes(cls, showall = False, lower = False):
     """Returns a dictionary of plugins"""
+    import_subclasses(cls)
+    return _plugin_classes(cls, showall, lower)
+
+def get_plugin_class(cls, name, lower = False):
+    """Returns the plugin called name, or None
+
+       Unlike get_plugin_classes, this only imports the modules defining
+       a class with that name.
+    """
+    if LAZY_IMPORTER:
+        LAZY_IMPORTER.import_class(name, lower)
+    return _plugin_classes(cls, lower = lower).get(name, None)
+
+def _plugin_classes(cls, showall = False, lower = False):
     # Plugins all make use of the Abstract concept
     result = {}
     for plugin in set(_get_subclasses(cls)):
@@ -153,7 +412,8 @@ def get_plugin_classes(cls, showall = False, lower = False):
     return result
 
 def register_global_options(config, cls):
-    ## Register all register_options for the various classes
-    for m in get_plugin_classes(cls, True).values():
+    ## Register all register_options for the various classes (modules
+    ## which register options are never imported lazily)
+    for m in _plugin_classes(cls, True).values():
         if hasattr(m, 'register_options'):
             m.register_options(config)
@@ -32,16 +32,98 @@
 @contact:      awalters@4tphi.net
 @organization: Volatility Foundation
 """
+import os
+import re
+import heapq
+import multiprocessing
+import cPickle as pickle
 import volatility.debug as debug
 import volatility.registry as registry
 import volatility.addrspace as addrspace
 import volatility.constants as constants
 import volatility.conf as conf
+config = conf.ConfObject()
+
+config.add_option("SCAN-WORKERS", default = 0, type = 'int',
+                  cache_invalidator = False,
+                  help = "Number of processes to use when scanning (0 or 1 scans serially)")
 
 ########### Following is the new implementation of the scanning
 ########### framework. The old framework was based on PyFlag's
 ########### scanning framework which is probably too complex for this.
 
+class StringMatcher(object):
+    """ A matcher for a set of strings which is built once and then
+    finds every place any of them start in a block of data in one pass.
+
+    A small number of unrelated needles are each found with str.find
+    (which runs at memchr speed) and the results merged through a heap.
+    Larger sets, or needles sharing a prefix (e.g. the KDBG headers),
+    are folded into a trie and compiled into a single regular expression
+    so that shared prefixes are only compared once. Either way the cost
+    of find_all() is one pass over the data plus a little per match.
+    """
+    ## Beyond this many needles without a common prefix we use the regex
+    max_find_needles = 4
+
+    def __init__(self, needles):
+        self.needles = sorted(set(needles))
+        if not self.needles or not min([ len(n) for n in self.needles ]):
+            raise ValueError("StringMatcher requires a non-empty list of non-empty needles")
+
+        trie = {}
+        for needle in self.needles:
+            node = trie
+            for c in needle:
+                node = node.setdefault(c, {})
+            node[''] = True
+
+        self.regex = None
+        if len(self.needles) > 1 and (len(trie) == 1 or len(self.needles) > self.max_find_needles):
+            self.regex = re.compile(self._node_pattern(trie), re.DOTALL)
+
+    @classmethod
+    def _node_pattern(cls, node):
+        # We only report where a match starts, so once any needle is
+        # complete there's no need to look for longer ones
+        if '' in node:
+            return ''
+        alternatives = [ re.escape(c) + cls._node_pattern(node[c]) for c in sorted(node) ]
+        if len(alternatives) == 1:
+            return alternatives[0]
+        return "(?:" + "|".join(alternatives) + ")"
+
+    def find_all(self, data, start = 0):
+        """ Yields every offset in data (including overlapping ones)
+        at which one of the needles starts, in ascending order """
+        if self.regex:
+            search = self.regex.search
+            match = search(data, start)
+            while match:
+                offset = match.start()
+                yield offset
+                match = search(data, offset + 1)
+            return
+
+        heap = []
+        for needle in self.needles:
+            offset = data.find(needle, start)
+            if offset >= 0:
+                heap.append((offset, needle))
+        heapq.heapify(heap)
+
+        last = -1
+        while heap:
+            offset, needle = heap[0]
+            if offset != last:
+                yield offset
+                last = offset
+            offset = data.find(needle, offset + 1)
+            if offset >= 0:
+                heapq.heapreplace(heap, (offset, needle))
+            else:
+                heapq.heappop(heap)
+
 class BaseScanner(object):
     """ A more thorough scanner which checks every byte """
     checks = []
@@ -49,19 +131,24 @@ class BaseScanner(object):
         self.buffer = addrspace.BufferAddressSpace(conf.DummyConfig(), data = '\x00' * 1024)
         self.window_size = window_size
         self.constraints = []
+        self.skippers = []
+        self.matcher = None
 
         self.error_count = 0
 
-    def check_addr(self, found):
-        """ This calls all our constraints on the offset found and
-        returns the number of contraints that matched.
+    def check_addr(self, found, constraints = None):
+        """ This calls all our constraints (or the ones given) on the
+        offset found and returns the number of contraints that matched.
 
         We shortcut the loop as soon as its obvious that there will
         not be sufficient matches to fit the criteria. This allows for
         an early exit and a speed boost.
         """
+        if constraints is None:
+            constraints = self.constraints
+
         cnt = 0
-        for check in self.constraints:
+        for check in constraints:
             ## constraints can raise for an error
             try:
                 val = check.check(found)
@@ -77,69 +164,308 @@ class BaseScanner(object):
 
         return True
 
-    overlap = 20
-    def scan(self, address_space, offset = 0, maxlen = None):
-        self.buffer.profile = address_space.profile
-        current_offset = offset
-
-        ## Build our constraints from the specified ScannerCheck
-        ## classes:
+    def build_constraints(self):
+        """ Builds our constraints from the specified ScannerCheck
+        classes, and works out which of them also have skippers.
+        """
         self.constraints = []
         for class_name, args in self.checks:
             check = registry.get_plugin_classes(ScannerCheck)[class_name](self.buffer, **args)
             self.constraints.append(check)
 
         ## Which checks also have skippers?
-        skippers = [ c for c in self.constraints if hasattr(c, "skip") ]
-
-        for (range_start, range_size) in sorted(address_space.get_available_addresses()):
-            # Jump to the next available point to scan from
-            # self.base_offset jumps up to be at least range_start
-            current_offset = max(range_start, current_offset)
-            range_end = range_start + range_size
-
-            # If we have a maximum length, we make sure it's less than the range_end
-            if maxlen:
-                range_end = min(range_end, offset + maxlen)
-
-            while (current_offset < range_end):
-                # We've now got range_start <= self.base_offset < range_end
-
-                # Figure out how much data to read
-                l = min(constants.SCAN_BLOCKSIZE + self.overlap, range_end - current_offset)
-
-                # Populate the buffer with data
-                # We use zread to scan what we can because there are often invalid
-                # pages in the DTB
-                data = address_space.zread(current_offset, l)
-                self.buffer.assign_buffer(data, current_offset)
-
-                ## Run checks throughout this block of data
-                i = 0
-                while i < l:
-                    if self.check_addr(i + current_offset):
-                        ## yield the offset to the start of the memory
-                        ## (after the pool tag)
-                        yield i + current_offset
-
-                    ## Where should we go next? By default we go 1 byte
-                    ## ahead, but if some of the checkers have skippers,
-                    ## we may actually go much farther. Checkers with
-                    ## skippers basically tell us that there is no way
-                    ## they can match anything before the skipped result,
-                    ## so there is no point in trying them on all the data
-                    ## in between. This optimization is useful to really
-                    ## speed things up. FIXME - currently skippers assume
-                    ## that the check must match, therefore we can skip
-                    ## the unmatchable region, but its possible that a
-                    ## scanner needs to match only some checkers.
-                    skip = 1
-                    for s in skippers:
-                        skip = max(skip, s.skip(data, i))
-
-                    i += skip
-
-                current_offset += min(constants.SCAN_BLOCKSIZE, l)
+        self.skippers = [ c for c in self.constraints if hasattr(c, "skip") ]
+
+        ## If any of the checks can only match where one of a known set
+        ## of strings starts, we compile the most selective set into a
+        ## matcher and only run the checks where it matches, rather
+        ## than stepping through the data with the skippers.
+        self.matcher = None
+        finders = [ c.match_strings() for c in self.constraints
+                    if getattr(c, "match_strings", None) ]
+        finders = [ f for f in finders if f ]
+        if finders:
+            best = max(finders, key = lambda f: min([ len(n) for n in f ]))
+            self.matcher = StringMatcher(best)
+
+    def object_offset(self, found, address_space):
+        """ Converts a hit into the offset reported to the caller.
+
+        BaseScanner reports the hit itself, subclasses may override
+        this to point at the start of the object instead.
+        """
+        return found
+
+    def check_candidates(self, data, block_offset, candidates):
+        """ Yields those of the candidate offsets (found in a block of
+        data read from block_offset) which pass all our constraints.
+
+        Checks which can evaluate a whole batch of offsets at once
+        (check_block) are run first over all the candidates, so the
+        remaining checks only run one at a time on the survivors. Since
+        batching assumes every check must pass, it is only used when
+        no errors are allowed.
+        """
+        remaining = self.constraints
+        if self.error_count == 0:
+            remaining = []
+            for check in self.constraints:
+                if candidates and hasattr(check, "check_block"):
+                    try:
+                        candidates = check.check_block(data, block_offset, candidates)
+                        continue
+                    except Exception:
+                        debug.b()
+                remaining.append(check)
+
+        for found in candidates:
+            if self.check_addr(found, remaining):
+                yield found
+
+    def scan_block(self, data, block_offset):
+        """ Runs the constraints over a block of data that was read
+        from block_offset, yielding the offsets of all the matches.
+
+        build_constraints() must have been called first.
+        """
+        self.buffer.assign_buffer(data, block_offset)
+
+        if self.matcher:
+            candidates = [ i + block_offset for i in self.matcher.find_all(data) ]
+            for found in self.check_candidates(data, block_offset, candidates):
+                yield found
+            return
+
+        l = len(data)
+
+        ## Run checks throughout this block of data
+        i = 0
+        while i < l:
+            if self.check_addr(i + block_offset):
+                ## yield the offset to the start of the memory
+                ## (after the pool tag)
+                yield i + block_offset
+
+            ## Where should we go next? By default we go 1 byte
+            ## ahead, but if some of the checkers have skippers,
+            ## we may actually go much farther. Checkers with
+            ## skippers basically tell us that there is no way
+            ## they can match anything before the skipped result,
+            ## so there is no point in trying them on all the data
+            ## in between. This optimization is useful to really
+            ## speed things up. FIXME - currently skippers assume
+            ## that the check must match, therefore we can skip
+            ## the unmatchable region, but its possible that a
+            ## scanner needs to match only some checkers.
+            skip = 1
+            for s in self.skippers:
+                skip = max(skip, s.skip(data, i))
+
+            i += skip
+
+    overlap = 20
+    def scan(self, address_space, offset = 0, maxlen = None):
+        self.buffer.profile = address_space.profile
+        self.build_constraints()
+
+        for hit in scan_blocks(self, address_space, offset, maxlen, self.overlap):
+            yield hit
+
+def get_blocks(address_space, offset = 0, maxlen = None, overlap = 0):
+    """ Splits the available ranges of an address space into blocks of
+    SCAN_BLOCKSIZE (plus overlap) bytes, yielding (block_offset, length).
+    """
+    current_offset = offset
+
+    for (range_start, range_size) in sorted(address_space.get_available_addresses()):
+        # Jump to the next available point to scan from
+        # self.base_offset jumps up to be at least range_start
+        current_offset = max(range_start, current_offset)
+        range_end = range_start + range_size
+
+        # If we have a maximum length, we make sure it's less than the range_end
+        if maxlen:
+            range_end = min(range_end, offset + maxlen)
+
+        while (current_offset < range_end):
+            # We've now got range_start <= self.base_offset < range_end
+
+            # Figure out how much data to read
+            l = min(constants.SCAN_BLOCKSIZE + overlap, range_end - current_offset)
+
+            yield current_offset, l
+
+            current_offset += min(constants.SCAN_BLOCKSIZE, l)
+
+def read_blocks(address_space, offset = 0, maxlen = None, overlap = 0):
+    """ Reads the available ranges of an address space in blocks of
+    SCAN_BLOCKSIZE (plus overlap) bytes, yielding (block_offset, data).
+    """
+    for block_offset, length in get_blocks(address_space, offset, maxlen, overlap):
+        # Populate the buffer with data
+        # We use zread to scan what we can because there are often invalid
+        # pages in the DTB
+        yield block_offset, address_space.zread(block_offset, length)
+
+## The scanner being run by scan_blocks() in worker processes. The
+## workers are forked after this has been set, so they inherit the
+## scanner and its checks (which often contain lambdas) rather than
+## having them pickled.
+_worker_scanner = None
+
+def _scan_chunk(args):
+    """ Scans a list of blocks in a worker process """
+    state, blocks = args
+    # Unpickling re-opens the address space stack in this process, so
+    # we don't share file handles (and their file offsets) with anyone
+    address_space = pickle.loads(state)
+
+    hits = []
+    for block_offset, length in blocks:
+        data = address_space.zread(block_offset, length)
+        hits.extend(_worker_scanner.scan_block(data, block_offset))
+    return hits
+
+def scan_blocks(scanner, address_space, offset = 0, maxlen = None, overlap = 0):
+    """ Runs scanner.scan_block() over each block of the address space,
+    yielding the hits in order.
+
+    If --scan-workers is set the blocks are handed out in chunks to a
+    pool of worker processes. The chunks are made of the same blocks a
+    serial scan would read, and the results are collected in order, so
+    the output is identical to the serial scan.
+    """
+    global _worker_scanner
+
+    workers = config.SCAN_WORKERS
+    state = None
+    if workers > 1:
+        if not hasattr(os, "fork"):
+            debug.warning("Parallel scanning requires fork(), scanning with a single process")
+        else:
+            try:
+                state = pickle.dumps(address_space, pickle.HIGHEST_PROTOCOL)
+            except (pickle.PickleError, TypeError), e:
+                debug.warning("Unable to pickle the address space for parallel scanning: {0}".format(e))
+
+    if state is None:
+        for block_offset, data in read_blocks(address_space, offset, maxlen, overlap):
+            for hit in scanner.scan_block(data, block_offset):
+                yield hit
+        return
+
+    blocks = list(get_blocks(address_space, offset, maxlen, overlap))
+    ## A few chunks per worker keeps them all busy without the chunks
+    ## getting so small that re-opening the address space dominates
+    chunksize = max(1, len(blocks) // (workers * 4))
+    chunks = [ (state, blocks[i:i + chunksize]) for i in range(0, len(blocks), chunksize) ]
+
+    _worker_scanner = scanner
+    pool = multiprocessing.Pool(workers)
+    try:
+        for hits in pool.imap(_scan_chunk, chunks):
+            for hit in hits:
+                yield hit
+        pool.close()
+    finally:
+        pool.terminate()
+        pool.join()
+        _worker_scanner = None
+
+class MultiScanner(object):
+    """ Runs a set of scanners over an address space in a single pass.
+
+    Each block of the address space is read only once and handed to
+    every scanner in turn, so running several scanners costs a single
+    pass of I/O over the image rather than one pass per scanner.
+
+    Scanners that have a matcher (e.g. all the pool scanners) share a
+    single StringMatcher built from all of their strings, and each
+    match is dispatched only to the scanners whose strings it was.
+
+    The blocks are read with the largest overlap of all the scanners,
+    but each scanner only sees as much of a block as it would have read
+    with its own overlap, so it finds exactly the hits it would find if
+    it had been run on its own.
+
+    The scanners are passed as a dict of name -> BaseScanner instance,
+    and scan() yields (name, offset) tuples in offset order, where the
+    offset has been through that scanner's object_offset().
+    """
+    def __init__(self, scanners):
+        self.scanners = scanners
+        self.matcher = None
+        self.lengths = []
+        self.unmatched = []
+
+    def build_constraints(self):
+        for scanner in self.scanners.values():
+            scanner.build_constraints()
+
+        ## Work out which scanners to dispatch each matched string to.
+        ## Strings are grouped by length so a hit can be dispatched
+        ## with one dict lookup per distinct length.
+        dispatch = {}
+        self.unmatched = []
+        for name, scanner in sorted(self.scanners.items()):
+            if not scanner.matcher:
+                self.unmatched.append(name)
+                continue
+            for needle in scanner.matcher.needles:
+                dispatch.setdefault(len(needle), {}).setdefault(needle, []).append(name)
+
+        self.matcher = None
+        if dispatch:
+            self.matcher = StringMatcher([ n for d in dispatch.values() for n in d ])
+        self.lengths = sorted(dispatch.items())
+
+    def scan_block(self, data, block_offset):
+        """ Returns a sorted list of (hit, name) for the block of data """
+        hits = []
+
+        ## The part of the block each scanner would have read on its own
+        ## (slicing to the full length returns data itself, not a copy)
+        blocks = {}
+        for name, scanner in self.scanners.items():
+            blocks[name] = data[:constants.SCAN_BLOCKSIZE + scanner.overlap]
+
+        if self.matcher:
+            for name, scanner in self.scanners.items():
+                scanner.buffer.assign_buffer(blocks[name], block_offset)
+
+            candidates = {}
+            for i in self.matcher.find_all(data):
+                for length, needles in self.lengths:
+                    for name in needles.get(data[i:i + length], []):
+                        if i + length <= len(blocks[name]):
+                            candidates.setdefault(name, []).append(i + block_offset)
+
+            for name, offsets in candidates.items():
+                scanner = self.scanners[name]
+                for hit in scanner.check_candidates(blocks[name], block_offset, offsets):
+                    hits.append((hit, name))
+
+        for name in self.unmatched:
+            for hit in self.scanners[name].scan_block(blocks[name], block_offset):
+                hits.append((hit, name))
+
+        ## Keep the output in offset order across all the scanners
+        hits.sort()
+        return hits
+
+    def scan(self, address_space, offset = 0, maxlen = None):
+        if not self.scanners:
+            return
+
+        for scanner in self.scanners.values():
+            scanner.buffer.profile = address_space.profile
+        self.build_constraints()
+
+        overlap = max([ s.overlap for s in self.scanners.values() ])
+
+        for hit, name in scan_blocks(self, address_space, offset, maxlen, overlap):
+            scanner = self.scanners[name]
+            yield name, scanner.object_offset(hit, address_space)
 
 class DiscontigScanner(BaseScanner):
     def scan(self, address_space, offset = 0, maxlen = None):
@@ -172,6 +498,22 @@ class ScannerCheck(object):
     #def skip(self, data, offset):
     #    return -1
 
+    ## If the check can only ever pass at an offset where one of a
+    ## fixed set of strings starts, define this method to return them.
+    ## The scanner compiles them into a StringMatcher once per scan and
+    ## only calls the checks at the offsets it finds, which is much
+    ## faster than skipping. This takes precedence over skip().
+    #def match_strings(self):
+    #    return []
+
+    ## If the check can be evaluated for many offsets at once straight
+    ## from the block of data, define this method to return the subset
+    ## of offsets (absolute, within the block read from block_offset)
+    ## which pass. Scanners use it to filter all the candidates in a
+    ## block before running the remaining checks one offset at a time.
+    #def check_block(self, data, block_offset, offsets):
+    #    return offsets
+
 class PoolScanner(BaseScanner):
 
     def object_offset(self, found, address_space):
@@ -28,8 +28,63 @@ import itertools
 
 #pylint: disable-msg=C0111
 
+## The address space stacks built by load_as, keyed by as_cache_key
+AS_CACHE = {}
+
+class _OptionRecorder(object):
+    """Records the names of the options an address space registers"""
+    def __init__(self):
+        self.names = set()
+
+    def add_option(self, option, *_args, **_kwargs):
+        self.names.add(option.upper().replace("-", "_"))
+
+def as_cache_key(config, astype, kwargs):
+    """Returns a fingerprint of everything which determines the stack that
+       load_as builds, or None if it can't be cached
+
+       This is the values of the options registered by the address spaces
+       (such as the location, profile and DTB), the astype and any other
+       arguments to load_as.
+    """
+    recorder = _OptionRecorder()
+    for cls in registry.get_plugin_classes(addrspace.BaseAddressSpace, True).values():
+        if hasattr(cls, 'register_options'):
+            cls.register_options(recorder)
+
+    key = (astype, tuple(sorted(kwargs.items())),
+           tuple([ (name, getattr(config, name, None)) for name in sorted(recorder.names) ]))
+    try:
+        hash(key)
+    except TypeError:
+        return None
+    return key
+
+def clear_as_cache():
+    """Discards the address spaces built by load_as, which must be done if
+       anything could have changed the image (e.g. writing to it)"""
+    AS_CACHE.clear()
+
 def load_as(config, astype = 'virtual', **kwargs):
-    """Loads an address space by stacking valid ASes on top of each other (priority order first)"""
+    """Loads an address space by stacking valid ASes on top of each other (priority order first)
+
+    The stacks are cached, so loading the same image again (with the same
+    options) returns the same address space, except when write support is
+    enabled.
+    """
+    if getattr(config, 'WRITE', False):
+        clear_as_cache()
+        return _load_as(config, astype, **kwargs)
+
+    key = as_cache_key(config, astype, kwargs)
+    if key is None:
+        return _load_as(config, astype, **kwargs)
+
+    if key not in AS_CACHE:
+        AS_CACHE[key] = _load_as(config, astype, **kwargs)
+    return AS_CACHE[key]
+
+def _load_as(config, astype = 'virtual', **kwargs):
 
     base_as = None
     error = exceptions.AddrSpaceError()
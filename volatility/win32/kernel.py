@@ -0,0 +1,146 @@
+# Volatility
+# Copyright (C) 2007-2013 Volatility Foundation
+#
+# This file is part of Volatility.
+#
+# Volatility is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# Volatility is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Volatility.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""
+@license:      GNU General Public License 2.0
+@organization: Volatility Foundation
+"""
+
+import volatility.obj as obj
+import volatility.cache as cache
+import volatility.utils as utils
+import volatility.exceptions as exceptions
+import volatility.debug as debug #pylint: disable-msg=W0611
+
+class KernelContext(object):
+    """ The kernel structures that plugins start from: the KDBG, and
+    the process and module lists it leads to.
+
+    Finding these means scanning for the KDBG (or the KPCRs) and
+    walking the lists, which every plugin would otherwise do again for
+    itself. A context finds each of them once for its address space,
+    and for the kernel address space also keeps their offsets in the
+    persistent cache (when --cache is on), so plugins run later against
+    the same image don't have to find them at all.
+    """
+    def __init__(self, addr_space):
+        self.addr_space = addr_space
+        self._config = addr_space.get_config()
+        self._kdbg = None
+        self._processes = None
+        self._modules = None
+
+        ## Only the kernel address space is stored in the cache, since
+        ## that's what the cache keys are for
+        self.persistent = False
+        if cache.config.CACHE:
+            try:
+                self.persistent = addr_space is utils.load_as(self._config)
+            except exceptions.AddrSpaceError:
+                pass
+
+    def _find_kdbg(self):
+        """Finds the KDBG by its signature, or from the KPCR"""
+        kdbgo = obj.VolMagic(self.addr_space).KDBG.v()
+
+        kdbg = obj.Object("_KDDEBUGGER_DATA64", offset = kdbgo, vm = self.addr_space)
+
+        if kdbg.is_valid():
+            return kdbg
+
+        # Fall back to finding it via the KPCR. We cannot
+        # accept the first/best suggestion, because only
+        # the KPCR for the first CPU allows us to find KDBG.
+        for kpcr_off in obj.VolMagic(self.addr_space).KPCR.generate_suggestions():
+
+            kpcr = obj.Object("_KPCR", offset = kpcr_off, vm = self.addr_space)
+
+            kdbg = kpcr.get_kdbg()
+
+            if kdbg.is_valid():
+                return kdbg
+
+        return obj.NoneObject("KDDEBUGGER structure not found using either KDBG signature or KPCR pointer")
+
+    @cache.CacheDecorator(lambda self: "kernel/{0}/kdbg".format(self._config.PROFILE))
+    def _kdbg_offset(self):
+        kdbg = self._find_kdbg()
+        if kdbg:
+            return kdbg.obj_offset
+        return None
+
+    @cache.CacheDecorator(lambda self: "kernel/{0}/processes".format(self._config.PROFILE))
+    def _process_offsets(self):
+        return [ p.obj_offset for p in self.kdbg().processes() ]
+
+    @cache.CacheDecorator(lambda self: "kernel/{0}/modules".format(self._config.PROFILE))
+    def _module_offsets(self):
+        return [ m.obj_offset for m in self.kdbg().modules() ]
+
+    def kdbg(self):
+        """Returns the _KDDEBUGGER_DATA64 (or a NoneObject if it can't be found)"""
+        if self._kdbg is None:
+            if not self.persistent:
+                self._kdbg = self._find_kdbg()
+            else:
+                offset = self._kdbg_offset()
+                if offset is None:
+                    self._kdbg = obj.NoneObject("KDDEBUGGER structure not found using either KDBG signature or KPCR pointer")
+                else:
+                    self._kdbg = obj.Object("_KDDEBUGGER_DATA64", offset = offset, vm = self.addr_space)
+        return self._kdbg
+
+    def processes(self):
+        """Returns the list of _EPROCESS in PsActiveProcessHead"""
+        if self._processes is None:
+            if not self.persistent:
+                self._processes = list(self.kdbg().processes())
+            else:
+                self._processes = [ obj.Object("_EPROCESS", offset = offset, vm = self.addr_space)
+                                    for offset in self._process_offsets() ]
+        return self._processes
+
+    def modules(self):
+        """Returns the list of _LDR_DATA_TABLE_ENTRY in PsLoadedModuleList"""
+        if self._modules is None:
+            if not self.persistent:
+                self._modules = list(self.kdbg().modules())
+            else:
+                self._modules = [ obj.Object("_LDR_DATA_TABLE_ENTRY", offset = offset, vm = self.addr_space)
+                                  for offset in self._module_offsets() ]
+        return self._modules
+
+def get_context(addr_space):
+    """Returns the KernelContext for an address space
+
+    The context is kept on the address space itself, so it lives
+    exactly as long as the address space does. Images which can be
+    written to (--write) may change under us, so they get a new context
+    each time.
+    """
+    if getattr(addr_space.get_config(), 'WRITE', False):
+        return KernelContext(addr_space)
+
+    ## Some views (such as snapshots) pass attributes through to the
+    ## address space under them, so check the context is really ours
+    context = getattr(addr_space, '_kernel_context', None)
+    if context is None or context.addr_space is not addr_space:
+        context = KernelContext(addr_space)
+        addr_space._kernel_context = context
+    return context
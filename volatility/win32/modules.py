@@ -25,10 +25,10 @@
 """
 
 #pylint: disable-msg=C0111
-import volatility.win32.tasks as tasks
+import volatility.win32.kernel as kernel
 
 def lsmod(addr_space):
     """ A Generator for modules """
 
-    for m in tasks.get_kdbg(addr_space).modules():
+    for m in kernel.get_context(addr_space).modules():
         yield m
@@ -28,6 +28,7 @@
 
 import volatility.obj as obj
 import volatility.debug as debug #pylint: disable-msg=W0611
+import volatility.win32.kernel as kernel
 from bisect import bisect_right
 
 def get_kdbg(addr_space):
@@ -41,33 +42,17 @@ def get_kdbg(addr_space):
     value, then neither method will succeed. The same is true 
     even if a user specifies --kdbg, because we check for the 
     OwnerTag even in that case. 
-    """
-
-    kdbgo = obj.VolMagic(addr_space).KDBG.v()
-
-    kdbg = obj.Object("_KDDEBUGGER_DATA64", offset = kdbgo, vm = addr_space)
-
-    if kdbg.is_valid():
-        return kdbg
 
-    # Fall back to finding it via the KPCR. We cannot
-    # accept the first/best suggestion, because only 
-    # the KPCR for the first CPU allows us to find KDBG. 
-    for kpcr_off in obj.VolMagic(addr_space).KPCR.generate_suggestions():
-        
-        kpcr = obj.Object("_KPCR", offset = kpcr_off, vm = addr_space)
-
-        kdbg = kpcr.get_kdbg()
-    
-        if kdbg.is_valid():
-            return kdbg
+    The KDBG is only found once for each address space (see
+    kernel.KernelContext).
+    """
 
-    return obj.NoneObject("KDDEBUGGER structure not found using either KDBG signature or KPCR pointer")
+    return kernel.get_context(addr_space).kdbg()
 
 def pslist(addr_space):
     """ A Generator for _EPROCESS objects """
 
-    for p in get_kdbg(addr_space).processes():
+    for p in kernel.get_context(addr_space).processes():
         yield p
 
 def find_space(addr_space, procs, mod_base):
@@ -31,75 +31,71 @@
 
 #pylint: disable-msg=C0111
 
-from struct import unpack
+from struct import unpack_from
 from struct import error as StructError
 
-def recombine(outbuf):
-    return "".join(outbuf[k] for k in sorted(outbuf.keys()))
-
 def xpress_decode(inputBuffer):
-    outputBuffer = {}
-    outputIndex = 0
+    """Decodes an Xpress (plain LZ77) compressed buffer.
+
+    The output is built up in a bytearray and back references are
+    copied as slices (repeating the pattern when the reference
+    overlaps the data it produces), rather than a byte at a time.
+    Decoding stops at the end of the input, or at the first token
+    which can't be decoded, returning what has been decoded so far.
+    """
+    outputBuffer = bytearray()
+    inputLength = len(inputBuffer)
     inputIndex = 0
-    indicatorBit = 0
     nibbleIndex = 0
 
     # we are decoding the entire input here, so I have changed
     # the check to see if we're at the end of the output buffer
     # with a check to see if we still have any input left.
-    while inputIndex < len(inputBuffer):
-        if (indicatorBit == 0):
-            # in pseudocode this was indicatorBit = ..., but that makes no
-            # sense, so I think this was intended...
-            try:
-                indicator = unpack("<L", inputBuffer[inputIndex:inputIndex + 4])[0]
-            except StructError:
-                return recombine(outputBuffer)
-
-            inputIndex += 4
-            indicatorBit = 32
+    while inputIndex < inputLength:
+        try:
+            indicator = unpack_from("<L", inputBuffer, inputIndex)[0]
+        except StructError:
+            break
+        inputIndex += 4
+
+        # Walk the indicator bits from the most significant down, a
+        # clear bit being a literal byte and a set bit a back reference
+        for indicatorBit in xrange(31, -1, -1):
+            if inputIndex >= inputLength:
+                break
+
+            if not (indicator >> indicatorBit) & 1:
+                outputBuffer.append(inputBuffer[inputIndex])
+                inputIndex += 1
+                continue
 
-        indicatorBit = indicatorBit - 1
-        # check whether the bit specified by indicatorBit is set or not 
-        # set in indicator. For example, if indicatorBit has value 4 
-        # check whether the 4th bit of the value in indicator is set
-        if not (indicator & (1 << indicatorBit)):
-            try:
-                outputBuffer[outputIndex] = inputBuffer[inputIndex]
-            except IndexError:
-                return recombine(outputBuffer)
-
-            inputIndex += 1
-            outputIndex += 1
-        else:
             # Get the length. This appears to use a scheme whereby if
             # the value at the current width is all ones, then we assume
             # that it is actually wider. First we try 3 bits, then 3
             # bits plus a nibble, then a byte, and finally two bytes (an
             # unsigned short). Also, if we are using a nibble, then every
-            # other time we get the nibble from the high part of the previous 
+            # other time we get the nibble from the high part of the previous
             # byte used as a length nibble.
             # Thus if a nibble byte is F2, we would first use the low part (2),
             # and then at some later point get the nibble from the high part (F).
-
             try:
-                length = unpack("<H", inputBuffer[inputIndex:inputIndex + 2])[0]
+                length = unpack_from("<H", inputBuffer, inputIndex)[0]
             except StructError:
-                return recombine(outputBuffer)
+                return str(outputBuffer)
 
             inputIndex += 2
-            offset = length / 8
-            length = length % 8
+            offset = length >> 3
+            length = length & 7
             if length == 7:
                 if nibbleIndex == 0:
                     nibbleIndex = inputIndex
-                    length = ord(inputBuffer[inputIndex]) % 16
+                    length = ord(inputBuffer[inputIndex]) & 0xF
                     inputIndex += 1
                 else:
                     # get the high nibble of the last place a nibble sized
                     # length was used thus we don't waste that extra half
                     # byte :p
-                    length = ord(inputBuffer[nibbleIndex]) / 16
+                    length = ord(inputBuffer[nibbleIndex]) >> 4
                     nibbleIndex = 0
 
                 if length == 15:
@@ -107,24 +103,29 @@ def xpress_decode(inputBuffer):
                     inputIndex += 1
                     if length == 255:
                         try:
-                            length = unpack("<H", inputBuffer[inputIndex:inputIndex + 2])[0]
+                            length = unpack_from("<H", inputBuffer, inputIndex)[0]
                         except StructError:
-                            return recombine(outputBuffer)
+                            return str(outputBuffer)
                         inputIndex = inputIndex + 2
                         length = length - (15 + 7)
                     length = length + 15
                 length = length + 7
             length = length + 3
 
-            while length != 0:
-                try:
-                    outputBuffer[outputIndex] = outputBuffer[outputIndex - offset - 1]
-                except KeyError:
-                    return recombine(outputBuffer)
-                outputIndex += 1
-                length -= 1
-
-    return recombine(outputBuffer)
+            distance = offset + 1
+            start = len(outputBuffer) - distance
+            if start < 0:
+                return str(outputBuffer)
+            if distance >= length:
+                outputBuffer += outputBuffer[start:start + length]
+            else:
+                # The reference overlaps the data it produces, so it
+                # repeats the last distance bytes
+                pattern = outputBuffer[start:]
+                repeats, extra = divmod(length, distance)
+                outputBuffer += pattern * repeats + pattern[:extra]
+
+    return str(outputBuffer)
 
 try:
     import pyxpress #pylint: disable-msg=F0401